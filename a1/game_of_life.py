@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""NumPy reference of Game_Of_Life.c for visualizing and checking runs."""
+import argparse
+import mmap
+import re
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+SEED = 12345
+# glibc random(): TYPE_3 additive feedback generator, r[i] = r[i - 3] + r[i - 31].
+RAND_DEG = 31
+RAND_SEP = 3
+RAND_DISCARD = 10 * RAND_DEG
+RAND_BLOCK = 4096
+GENERATION_CHUNK = 1 << 20
+
+WORD = 64
+# Generations advanced per pass over the board.
+BATCH = 4
+# Rows per block, at least 8 * BATCH so the halo adds at most 25%: the block
+# and the temporaries of a generation stay in L2.
+BLOCK_BYTES = 128 * 1024
+# convert -delay 20 in FINALIZE, in 1/100 s.
+GIF_DELAY = 20
+GIF_MAX_SIZE = 65535
+GIF_BLOCK = 255
+# LZW codes of a 2-color image (minimum code size 2): pixels are 0/1.
+GIF_CLEAR = 4
+GIF_EOI = 5
+GIF_CHUNK_PIXELS = 1 << 20
+PGM_RE = re.compile(r"out(\d+)\.pgm$")
+PGM_HEADER_RE = re.compile(rb"P5\s+(\d+)\s+(\d+)\s+(\d+)\s")
+
+
+def rand_matrix(block):
+    """Coefficients of the next `block` values of the generator over the last RAND_DEG values (mod 2^32)."""
+    rows = list(np.eye(RAND_DEG, dtype=np.uint64))
+    for _ in range(block):
+        rows.append((rows[-RAND_SEP] + rows[-RAND_DEG]) & np.uint64(0xFFFFFFFF))
+    return np.array(rows[RAND_DEG:])
+
+
+def glibc_rand(seed, count):
+    """Yield the first count values of rand() after srand(seed), in chunks."""
+    state = [seed or 1]
+    for _ in range(1, RAND_DEG):
+        hi, lo = divmod(state[-1], 127773)
+        word = 16807 * lo - 2836 * hi
+        state.append(word + 2147483647 if word < 0 else word)
+    state += state[:RAND_SEP]
+    window = np.array(state[-RAND_DEG:], dtype=np.uint64)
+    matrix = rand_matrix(RAND_BLOCK)
+    skip = RAND_DISCARD
+    pending = []
+    produced = 0
+    while produced < count:
+        # Products wrap mod 2^64, which keeps them right mod 2^32.
+        values = (matrix @ window) & np.uint64(0xFFFFFFFF)
+        window = values[-RAND_DEG:]
+        values = values[skip:]
+        skip = 0
+        pending.append((values >> np.uint64(1)).astype(np.int64))
+        if sum(len(chunk) for chunk in pending) >= GENERATION_CHUNK or produced + len(values) >= count:
+            chunk = np.concatenate(pending)[:count - produced]
+            pending = []
+            produced += len(chunk)
+            yield chunk
+
+
+def words_per_row(N):
+    return (N + WORD - 1) // WORD
+
+
+def pack_rows(cells):
+    """(rows, N) 0/1 cells -> (rows, words) uint64, column j at bit j % 64 of word j // 64."""
+    rows, N = cells.shape
+    padded = np.zeros((rows, words_per_row(N) * WORD), dtype=np.uint8)
+    padded[:, :N] = cells
+    return np.packbits(padded, axis=1, bitorder="little").view("<u8")
+
+
+def unpack_rows(board, N):
+    return np.unpackbits(board.view(np.uint8), axis=1, count=N, bitorder="little")
+
+
+def interior_mask(N):
+    """Columns 1 .. N - 2: the border and the padding bits stay dead."""
+    cells = np.zeros((1, N), dtype=np.uint8)
+    cells[0, 1:N - 1] = 1
+    return pack_rows(cells)[0]
+
+
+def init_random(N, seed=SEED):
+    """init_random(): both C arrays get the same cells, so one board is enough."""
+    board = np.zeros((N, words_per_row(N)), dtype="<u8")
+    count = (N * N) // 10
+    if not count:
+        return board
+    side = N - 2
+    for values in glibc_rand(seed, count):
+        pos = values % (side * side)
+        rows = pos % side + 1
+        cols = pos // side + 1
+        bits = np.left_shift(np.uint64(1), (cols % WORD).astype(np.uint64))
+        np.bitwise_or.at(board, (rows, cols // WORD), bits)
+    return board
+
+
+def west(words):
+    """Each cell's left neighbour (column j - 1) moved to column j."""
+    shifted = words << np.uint64(1)
+    shifted[..., 1:] |= words[..., :-1] >> np.uint64(WORD - 1)
+    return shifted
+
+
+def east(words):
+    shifted = words >> np.uint64(1)
+    shifted[..., :-1] |= words[..., 1:] << np.uint64(WORD - 1)
+    return shifted
+
+
+def step(board, mask):
+    """
+    One generation. The count includes the cell itself, so a cell lives if
+    the 3x3 sum is 3, or 4 and it was alive (nbrs == 3 || previous + nbrs == 3).
+    The sum only needs three bits: 9 wraps to 1, which dies like 1 does.
+    Rows 0 and -1 come out dead.
+    """
+    left = west(board)
+    right = east(board)
+    # Horizontal sums of three cells as two bit planes (weights 1 and 2).
+    half = left ^ board
+    ones = half ^ right
+    twos = (left & board) | (half & right)
+    up, mid, down = slice(None, -2), slice(1, -1), slice(2, None)
+    half = ones[up] ^ ones[mid]
+    bit0 = half ^ ones[down]
+    carry = (ones[up] & ones[mid]) | (half & ones[down])
+    half = twos[up] ^ twos[mid]
+    sum2 = half ^ twos[down]
+    sum4 = (twos[up] & twos[mid]) | (half & twos[down])
+    bit1 = sum2 ^ carry
+    bit2 = sum4 ^ (sum2 & carry)
+    alive = (bit0 & bit1 & ~bit2) | (board[mid] & ~bit0 & ~bit1 & bit2)
+    new = np.zeros_like(board)
+    new[1:-1] = alive & mask
+    return new
+
+
+def block_rows_for(board, batch):
+    return max(8 * batch, BLOCK_BYTES // (board.shape[1] * 8))
+
+
+def advance(board, steps, mask, batch=BATCH, block_rows=None):
+    """
+    Run `steps` generations, `batch` at a time: each block of rows is
+    advanced together with `batch` halo rows on both sides (the halo goes
+    stale one row per generation, which is exactly what it is there for).
+    """
+    N = board.shape[0]
+    if block_rows is None:
+        block_rows = block_rows_for(board, batch)
+    out = np.empty_like(board)
+    while steps > 0:
+        depth = min(batch, steps)
+        if N <= block_rows + 2 * depth:
+            for _ in range(depth):
+                board = step(board, mask)
+        else:
+            for r0 in range(0, N, block_rows):
+                r1 = min(r0 + block_rows, N)
+                a0 = max(0, r0 - depth)
+                a1 = min(N, r1 + depth)
+                block = board[a0:a1]
+                for _ in range(depth):
+                    block = step(block, mask)
+                out[r0:r1] = block[r0 - a0:r1 - a0]
+            board, out = out, board
+        steps -= depth
+    return board
+
+
+def simulate(N, steps, every, batch=BATCH, block_rows=None, seed=SEED):
+    """Yield (t, board) at t = 0, every, 2 * every, ... <= steps, then the last board."""
+    board = init_random(N, seed)
+    mask = interior_mask(N)
+    t = 0
+    yield t, board
+    while t < steps:
+        stride = min(every, steps - t) if every else steps - t
+        board = advance(board, stride, mask, batch, block_rows)
+        t += stride
+        yield t, board
+
+
+def write_pgm(path, board, N):
+    """print_to_pgm(): "P5\\nN N 1\\n" and one 0/1 byte per cell."""
+    with open(path, "wb") as handle:
+        handle.write(f"P5\n{N} {N} 1\n".encode())
+        handle.write(unpack_rows(board, N).tobytes())
+
+
+def read_pgm(path):
+    data = Path(path).read_bytes()
+    match = PGM_HEADER_RE.match(data)
+    if not match:
+        raise ValueError("not a binary PGM")
+    width, height, maxval = (int(value) for value in match.groups())
+    if maxval > 255:
+        raise ValueError("16-bit PGM")
+    pixels = np.frombuffer(data, dtype=np.uint8, count=width * height, offset=match.end())
+    return (pixels.reshape(height, width) > maxval // 2).astype(np.uint8)
+
+
+def pack_codes(codes):
+    """3-bit LZW codes, eight at a time, into GIF bytes (least significant bit first)."""
+    groups = codes.reshape(-1, 8).astype(np.uint32) << np.arange(0, 24, 3, dtype=np.uint32)
+    words = np.bitwise_or.reduce(groups, axis=1).astype("<u4")
+    return words.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+def unpack_codes(data):
+    """Inverse of pack_codes for whole groups of three bytes."""
+    raw = np.frombuffer(data, dtype=np.uint8)[:len(data) // 3 * 3].reshape(-1, 3).astype(np.uint32)
+    words = raw[:, 0] | (raw[:, 1] << np.uint32(8)) | (raw[:, 2] << np.uint32(16))
+    return ((words[:, None] >> np.arange(0, 24, 3, dtype=np.uint32)) & np.uint32(7)).astype(np.uint8).reshape(-1)
+
+
+class GifWriter:
+    """
+    Animated GIF written frame by frame. Each pixel is a literal LZW code
+    with a clear code every two pixels, before the table grows past 3-bit
+    codes: about 4.5 bits per pixel, but encoded with array operations and
+    nothing but the current rows kept in memory.
+    """
+
+    def __init__(self, path, N, scale=1, delay=GIF_DELAY):
+        self.N = N
+        self.scale = scale
+        self.size = N * scale
+        if self.size > GIF_MAX_SIZE:
+            raise ValueError(f"GIF frames are limited to {GIF_MAX_SIZE} pixels per side")
+        self.delay = delay
+        self.handle = open(path, "wb")
+        self.handle.write(b"GIF89a" + struct.pack("<HHBBB", self.size, self.size, 0x80, 0, 0))
+        self.handle.write(bytes([0, 0, 0, 255, 255, 255]))
+        # NETSCAPE2.0 extension: loop forever, as convert does.
+        self.handle.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def frame(self, board):
+        head = b"\x21\xf9\x04\x04" + struct.pack("<H", self.delay) + b"\x00\x00"
+        head += b"\x2c" + struct.pack("<HHHHB", 0, 0, self.size, self.size, 0) + b"\x02"
+        self.handle.write(head)
+        self.codes = np.zeros(0, dtype=np.uint8)
+        self.pending = b""
+        # An even number of board rows per chunk: only the last chunk can hold an odd number of pixels.
+        rows = max(2, GIF_CHUNK_PIXELS // (self.size * self.scale) // 2 * 2)
+        for r0 in range(0, self.N, rows):
+            cells = unpack_rows(board[r0:r0 + rows], self.N)
+            if self.scale > 1:
+                cells = np.repeat(np.repeat(cells, self.scale, axis=1), self.scale, axis=0)
+            self.encode(cells.reshape(-1), last=r0 + rows >= self.N)
+
+    def encode(self, pixels, last):
+        pairs = len(pixels) // 2
+        codes = np.full((pairs, 3), GIF_CLEAR, dtype=np.uint8)
+        codes[:, 1:] = pixels[:2 * pairs].reshape(pairs, 2)
+        tail = [GIF_CLEAR, pixels[-1]] if len(pixels) % 2 else []
+        tail += [GIF_EOI] if last else []
+        codes = np.concatenate([self.codes, codes.reshape(-1), np.array(tail, dtype=np.uint8)])
+        if last:
+            count = len(codes)
+            codes = np.concatenate([codes, np.zeros(-count % 8, dtype=np.uint8)])
+            data = self.pending + pack_codes(codes)[:(3 * count + 7) // 8]
+        else:
+            whole = len(codes) // 8 * 8
+            data = self.pending + pack_codes(codes[:whole])
+            self.codes = codes[whole:]
+        full = len(data) // GIF_BLOCK * GIF_BLOCK
+        blocks = np.empty((full // GIF_BLOCK, GIF_BLOCK + 1), dtype=np.uint8)
+        blocks[:, 0] = GIF_BLOCK
+        blocks[:, 1:] = np.frombuffer(data[:full], dtype=np.uint8).reshape(-1, GIF_BLOCK)
+        self.handle.write(blocks.tobytes())
+        self.pending = data[full:]
+        if last:
+            if self.pending:
+                self.handle.write(bytes([len(self.pending)]) + self.pending)
+            self.handle.write(b"\x00")
+
+    def close(self):
+        self.handle.write(b"\x3b")
+        self.handle.close()
+
+
+def literal_decode(data, count):
+    """
+    Pixels of a stream of literals with a clear code before every two, as
+    GifWriter writes them (the codes never grow past 3 bits), or None for
+    any other stream.
+    """
+    size = 3 * (count // 2) + 2 * (count % 2) + 1
+    needed = (3 * size + 7) // 8
+    if len(data) < needed:
+        return None
+    pixels = np.empty(count, dtype=np.uint8)
+    done = 0
+    # 9 bytes hold 24 codes, so every chunk starts on a clear code.
+    chunk = 9 * (GIF_CHUNK_PIXELS // 16)
+    for start in range(0, needed, chunk):
+        raw = bytes(data[start:start + chunk])
+        codes = unpack_codes(raw + bytes(-len(raw) % 3))[:size - start * 8 // 3]
+        if start + chunk >= needed:
+            if codes[-1] != GIF_EOI:
+                return None
+            codes = codes[:-1]
+        if not (codes[::3] == GIF_CLEAR).all():
+            return None
+        body = np.delete(codes, np.s_[::3])
+        if done + len(body) > count or not (body < GIF_CLEAR).all():
+            return None
+        pixels[done:done + len(body)] = body
+        done += len(body)
+    return pixels if done == count else None
+
+
+def lzw_decode(data, min_size):
+    clear = 1 << min_size
+    eoi = clear + 1
+    table = [bytes([code]) for code in range(clear)] + [b"", b""]
+    width = min_size + 1
+    out = bytearray()
+    prev = None
+    buffer = 0
+    nbits = 0
+    for byte in data:
+        buffer |= byte << nbits
+        nbits += 8
+        while nbits >= width:
+            code = buffer & ((1 << width) - 1)
+            buffer >>= width
+            nbits -= width
+            if code == clear:
+                del table[clear + 2:]
+                width = min_size + 1
+                prev = None
+                continue
+            if code == eoi:
+                return out
+            if prev is None:
+                entry = table[code]
+            else:
+                entry = table[code] if code < len(table) else prev + prev[:1]
+                if len(table) < 4096:
+                    table.append(prev + entry[:1])
+            out += entry
+            if len(table) == 1 << width and width < 12:
+                width += 1
+            prev = entry
+    return out
+
+
+def read_sub_blocks(data, pos):
+    chunks = []
+    while data[pos]:
+        chunks.append(data[pos + 1:pos + 1 + data[pos]])
+        pos += 1 + data[pos]
+    return b"".join(chunks), pos + 1
+
+
+def read_gif(path):
+    """
+    Yield the frames of a GIF as 0/1 arrays, a pixel being alive if its
+    color is bright. Frames are composed as a viewer would (offsets,
+    transparency and disposal), so optimized GIFs read back whole.
+    """
+    with open(path, "rb") as handle:
+        data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError("not a GIF")
+    width, height, flags = struct.unpack("<HHB", data[6:11])
+    pos = 13
+    palette = None
+    if flags & 0x80:
+        entries = 2 << (flags & 7)
+        palette = np.frombuffer(data[pos:pos + 3 * entries], dtype=np.uint8).reshape(-1, 3)
+        pos += 3 * entries
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    disposal, transparent = 0, None
+    while pos < len(data) and data[pos] != 0x3B:
+        if data[pos] == 0x21:
+            label = data[pos + 1]
+            block, pos = read_sub_blocks(data, pos + 2)
+            # Graphic control extension of the next image.
+            if label == 0xF9 and len(block) >= 4:
+                disposal = (block[0] >> 2) & 7
+                transparent = block[3] if block[0] & 1 else None
+            continue
+        if data[pos] != 0x2C:
+            raise ValueError(f"unexpected block 0x{data[pos]:02x}")
+        left, top, w, h, flags = struct.unpack("<HHHHB", data[pos + 1:pos + 10])
+        pos += 10
+        colors = palette
+        if flags & 0x80:
+            entries = 2 << (flags & 7)
+            colors = np.frombuffer(data[pos:pos + 3 * entries], dtype=np.uint8).reshape(-1, 3)
+            pos += 3 * entries
+        if colors is None:
+            raise ValueError("image without a color table")
+        min_size = data[pos]
+        stream, pos = read_sub_blocks(data, pos + 1)
+        indices = literal_decode(stream, w * h) if min_size == 2 else None
+        if indices is None:
+            indices = np.frombuffer(lzw_decode(stream, min_size), dtype=np.uint8)
+        if len(indices) < w * h:
+            raise ValueError("truncated image data")
+        indices = indices[:w * h].reshape(h, w)
+        if flags & 0x40:
+            order = np.concatenate([np.arange(start, h, step) for start, step in ((0, 8), (4, 8), (2, 4), (1, 2))])
+            deinterlaced = np.empty_like(indices)
+            deinterlaced[order] = indices
+            indices = deinterlaced
+        bright = np.zeros(256, dtype=np.uint8)
+        bright[:len(colors)] = colors.astype(np.int32).sum(axis=1) >= 3 * 128
+        area = canvas[top:top + h, left:left + w]
+        previous = area.copy() if disposal == 3 else None
+        if transparent is None:
+            area[...] = bright[indices]
+        else:
+            np.copyto(area, bright[indices], where=indices != transparent)
+        yield canvas.copy()
+        if disposal == 2:
+            area[...] = 0
+        elif disposal == 3:
+            area[...] = previous
+        disposal, transparent = 0, None
+
+
+def frame_series(paths, every):
+    """
+    (label, frames) per run to check, frames being (t, cells) in order of t.
+    A GIF holds t = 0, every, 2 * every, ...; PGM files carry t in their
+    name and are checked as one run per directory, or one for all files given.
+    """
+    series = []
+    loose = []
+    for path in paths:
+        if path.is_dir():
+            matches = ((PGM_RE.search(item.name), item) for item in path.iterdir())
+            series.append((str(path), sorted((int(match.group(1)), item) for match, item in matches if match)))
+        elif PGM_RE.search(path.name):
+            loose.append((int(PGM_RE.search(path.name).group(1)), path))
+        else:
+            series.append((str(path), path))
+    if loose:
+        series.append((f"{loose[0][1].parent / 'out*.pgm'}", sorted(loose)))
+    for label, source in series:
+        if isinstance(source, Path):
+            frames = ((every * idx, cells) for idx, cells in enumerate(read_gif(source)))
+        else:
+            frames = ((t, read_pgm(path)) for t, path in source)
+        yield label, frames
+
+
+def compare_frame(cells, board, N):
+    """Differing cells of a frame, scaled GIF frames being sampled once per cell."""
+    height, width = cells.shape
+    if height != width or height % N:
+        raise ValueError(f"{width}x{height} frame is not a {N}x{N} board")
+    scale = height // N
+    return np.argwhere(cells[::scale, ::scale] != unpack_rows(board, N))
+
+
+def check_frames(paths, N, every, batch, block_rows):
+    """Replay the run along the frames of every file; returns the number of failed ones."""
+    failed = 0
+    for label, frames in frame_series(paths, every):
+        errors = []
+        checked = 0
+        try:
+            size = N
+            for t, cells in frames:
+                if not checked:
+                    size = size or cells.shape[0]
+                    board, now, mask = init_random(size), 0, interior_mask(size)
+                if t < now:
+                    raise ValueError(f"frame {t} comes after frame {now}")
+                board = advance(board, t - now, mask, batch, block_rows)
+                now = t
+                diff = compare_frame(cells, board, size)
+                if len(diff):
+                    i, j = diff[0]
+                    errors.append(f"frame {t}: {len(diff)} cells differ, first at [{i}][{j}]")
+                checked += 1
+            if not checked:
+                raise ValueError("no frames")
+        except (OSError, ValueError) as exc:
+            print(f"{label}: FAILED ({exc})")
+            failed += 1
+            continue
+        if errors:
+            failed += 1
+            print(f"{label}: FAILED ({len(errors)} of {checked} frames differ)")
+            for error in errors[:10]:
+                print(f"  {error}")
+            if len(errors) > 10:
+                print(f"  ... and {len(errors) - 10} more")
+        else:
+            print(f"{label}: PASSED ({checked} frames of a {size}x{size} board)")
+    return failed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="NumPy reference of Game_Of_Life.c with streaming frame output.")
+    parser.add_argument("N", type=int, nargs="?", help="array size; with --check alone, needed for scaled GIFs")
+    parser.add_argument("T", type=int, nargs="?", help="time steps")
+    parser.add_argument("--gif", type=Path, help="write the frames to this animated GIF")
+    parser.add_argument("--pgm", type=Path, help="write out<t>.pgm frames into this directory, as -DOUTPUT does")
+    parser.add_argument("--every", type=int, default=1, help="steps between frames, also for GIFs given to --check (default: 1)")
+    parser.add_argument("--scale", type=int, default=1, help="GIF pixels per cell (default: 1)")
+    parser.add_argument("--batch", type=int, default=BATCH, help=f"generations per pass over a block (default: {BATCH})")
+    parser.add_argument("--block-rows", type=int, help="rows per block (default: about 128 KiB of packed rows)")
+    parser.add_argument("--check", type=Path, nargs="+", default=[], help="output.gif, out*.pgm files or directories to compare against")
+    args = parser.parse_args(argv)
+    if not args.check and args.T is None:
+        parser.error("N and T are required unless --check is given")
+    if args.N is not None and args.N < 3:
+        parser.error("N must be at least 3")
+    if args.T is not None and args.T < 0:
+        parser.error("T must be >= 0")
+    if args.every < 1 or args.scale < 1 or args.batch < 1:
+        parser.error("--every, --scale and --batch must be >= 1")
+    if args.gif and (args.N or 0) * args.scale > GIF_MAX_SIZE:
+        parser.error(f"GIF frames are limited to {GIF_MAX_SIZE} pixels per side, lower --scale")
+    return args
+
+
+def run(args):
+    N, T = args.N, args.T
+    writers = []
+    if args.gif:
+        gif = GifWriter(args.gif, N, args.scale)
+        writers.append(lambda board, t: gif.frame(board))
+    if args.pgm:
+        args.pgm.mkdir(parents=True, exist_ok=True)
+        writers.append(lambda board, t: write_pgm(args.pgm / f"out{t}.pgm", board, N))
+    frames = simulate(N, T, args.every if writers else 0, args.batch, args.block_rows)
+    # As in the C code the clock starts after the first frame.
+    t, board = next(frames)
+    for write in writers:
+        write(board, t)
+    started = time.perf_counter()
+    for t, board in frames:
+        if t % args.every:
+            continue
+        for write in writers:
+            write(board, t)
+    elapsed = time.perf_counter() - started
+    if args.gif:
+        gif.close()
+    print(f"GameOfLife: Size {N} Steps {T} Time {elapsed:f}")
+    return board
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.T is not None:
+        run(args)
+    if args.check:
+        if args.T is not None:
+            print()
+        if check_frames(args.check, args.N, args.every, args.batch, args.block_rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""NumPy reference of seq_kmeans.c for validating k-means results without a GPU."""
+import argparse
+import multiprocessing
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+RAND_MAX = 2147483647
+VAL_RANGE = 10.0
+DOUBLE = 8
+# Objects per distance chunk: keeps the (chunk x numClusters) distance block in L2.
+CHUNK_BYTES = 512 * 1024
+GENERATION_CHUNK = 1 << 20
+# Distances closer than this (times numCoords and the squared norms) are
+# re-ranked exactly; generous against the ~numCoords * 2^-53 error of the
+# norm expansion.
+TIE_TOLERANCE = 64 * np.finfo(np.float64).eps
+# Same tolerance as validation_eps in main_gpu.cu.
+VALIDATION_EPS = 1e-2
+
+HEADER_RE = re.compile(r"numObjs\s*=\s*(\d+)\s+numCoords\s*=\s*(\d+)\s+numClusters\s*=\s*(\d+)")
+CLUSTER_RE = re.compile(r"clusters\[(\d+)\]\s*=((?:\s+-?\d+(?:\.\d+)?)+)")
+NLOOPS_RE = re.compile(r"nloops\s*=\s*(\d+)")
+
+# Set before the pool forks so the workers share the objects instead of pickling them.
+_objects = None
+
+
+def num_objects(dataset_size, num_coords):
+    return int(dataset_size * 1024 * 1024 / (num_coords * DOUBLE))
+
+
+def rand_r_step(state):
+    # glibc rand_r(): three LCG steps, 11 + 10 + 10 bits of output.
+    state = state * np.uint32(1103515245) + np.uint32(12345)
+    result = (state >> np.uint32(16)) % np.uint32(2048)
+    state = state * np.uint32(1103515245) + np.uint32(12345)
+    result = (result << np.uint32(10)) ^ ((state >> np.uint32(16)) % np.uint32(1024))
+    state = state * np.uint32(1103515245) + np.uint32(12345)
+    result = (result << np.uint32(10)) ^ ((state >> np.uint32(16)) % np.uint32(1024))
+    return state, result
+
+
+def dataset_generation(num_objs, num_coords):
+    """dataset_generation() of file_io.c, one rand_r() stream per object."""
+    objects = np.empty((num_objs, num_coords), dtype=np.float64)
+    for start in range(0, num_objs, GENERATION_CHUNK):
+        stop = min(start + GENERATION_CHUNK, num_objs)
+        state = np.arange(start, stop, dtype=np.uint32)
+        for j in range(num_coords):
+            state, value = rand_r_step(state)
+            objects[start:stop, j] = value / float(RAND_MAX) * VAL_RANGE
+    return objects
+
+
+def load_objects(path, num_coords):
+    """Raw row-major doubles, i.e. the objects array as written by fwrite()."""
+    data = np.memmap(path, dtype=np.float64, mode="r")
+    if data.size % num_coords:
+        raise ValueError(f"{path}: {data.size} doubles is not a multiple of numCoords={num_coords}")
+    return data.reshape(-1, num_coords)
+
+
+def initial_clusters(objects, num_clusters):
+    """The first objects, sorted by coordinate 0, then 1, ... like check_repeated_clusters()."""
+    clusters = np.array(objects[:num_clusters], dtype=np.float64)
+    order = np.lexsort(clusters.T[::-1])
+    if len(np.unique(clusters, axis=0)) < num_clusters:
+        return None
+    return clusters[order]
+
+
+def exact_distances(objects, clusters):
+    # Column by column, in the summation order of euclid_dist_2().
+    columns = np.ascontiguousarray(objects.T)[:, :, None]
+    dist = np.zeros((objects.shape[0], clusters.shape[0]))
+    diff = np.empty_like(dist)
+    for j in range(objects.shape[1]):
+        np.subtract(columns[j], clusters[:, j], out=diff)
+        np.multiply(diff, diff, out=diff)
+        dist += diff
+    return dist
+
+
+def nearest_clusters(objects, clusters):
+    """
+    Ranks the clusters with |x|^2 - 2 x.c + |c|^2 (one matrix product) and
+    recomputes the exact distances only for objects whose best clusters are
+    closer than the rounding error of that expansion. argmin keeps the first
+    minimum, as the strict '<' of find_nearest_cluster() does.
+    """
+    rows = np.arange(len(objects))
+    cluster_norms = np.einsum("ij,ij->i", clusters, clusters)
+    # |x|^2 is the same for every cluster and does not change the ranking.
+    dist = objects @ (-2.0 * clusters.T)
+    dist += cluster_norms
+    index = dist.argmin(axis=1)
+    object_norms = np.einsum("ij,ij->i", objects, objects)
+    tolerance = TIE_TOLERANCE * objects.shape[1] * (object_norms + cluster_norms.max())
+    close = dist <= (dist[rows, index] + tolerance)[:, None]
+    # Every row matches its own minimum; anything more is a near tie.
+    if np.count_nonzero(close) > len(rows):
+        ties = np.flatnonzero(np.count_nonzero(close, axis=1) > 1)
+        index[ties] = exact_distances(objects[ties], clusters).argmin(axis=1)
+    return index.astype(np.int32)
+
+
+def assign_chunk(bounds, clusters):
+    start, stop = bounds
+    return nearest_clusters(np.asarray(_objects[start:stop]), clusters)
+
+
+def chunk_bounds(num_objs, num_clusters, chunk):
+    chunk = chunk or max(1, CHUNK_BYTES // (DOUBLE * num_clusters))
+    return [(start, min(start + chunk, num_objs)) for start in range(0, num_objs, chunk)]
+
+
+def kmeans(objects, num_clusters, threshold, loop_threshold, jobs=1, chunk=None, verbose=True):
+    global _objects
+    num_objs, num_coords = objects.shape
+    clusters = initial_clusters(objects, num_clusters)
+    membership = np.full(num_objs, -1, dtype=np.int32)
+    bounds = chunk_bounds(num_objs, num_clusters, chunk)
+    _objects = objects
+    pool = None
+    if jobs > 1 and len(bounds) > 1:
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+    loop = 0
+    timings = []
+    try:
+        while True:
+            started = time.perf_counter()
+            if pool is not None:
+                parts = pool.starmap(assign_chunk, [(b, clusters) for b in bounds])
+            else:
+                parts = [assign_chunk(b, clusters) for b in bounds]
+            new_membership = np.concatenate(parts)
+            delta = np.count_nonzero(new_membership != membership) / num_objs
+            membership = new_membership
+            # bincount adds the weights in object order, like the C loop.
+            sizes = np.bincount(membership, minlength=num_clusters)
+            for j in range(num_coords):
+                sums = np.bincount(membership, weights=objects[:, j], minlength=num_clusters)
+                nonempty = sizes > 0
+                clusters[nonempty, j] = sums[nonempty] / sizes[nonempty]
+            loop += 1
+            timings.append(time.perf_counter() - started)
+            if verbose:
+                print(f"delta is {delta:f} - completed loop {loop}")
+            if not (delta > threshold and loop < loop_threshold):
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _objects = None
+    return clusters, membership, loop, timings
+
+
+def print_clusters(clusters):
+    for i, center in enumerate(clusters):
+        print(f"clusters[{i}] = " + " ".join(f"{value:6.6f}" for value in center))
+
+
+def parse_runs(text):
+    """Splits an appended log into runs, one per "numObjs = ..." header."""
+    starts = [m.start() for m in HEADER_RE.finditer(text)] or [0]
+    runs = []
+    for begin, end in zip(starts, starts[1:] + [len(text)]):
+        chunk = text[begin:end]
+        header = HEADER_RE.search(chunk)
+        loops = NLOOPS_RE.search(chunk)
+        # The last line printed for a cluster index wins: that is the final
+        # center, either from the last loop or from "Final cluster centers".
+        values = {}
+        for match in CLUSTER_RE.finditer(chunk):
+            values[int(match.group(1))] = match.group(2).split()
+        clusters = None
+        decimals = 0
+        if values and sorted(values) == list(range(len(values))):
+            clusters = np.array([[float(v) for v in values[i]] for i in range(len(values))])
+            decimals = min(len(v.partition(".")[2]) for row in values.values() for v in row)
+        runs.append({
+            "header": tuple(int(v) for v in header.groups()) if header else None,
+            "nloops": int(loops.group(1)) if loops else None,
+            "clusters": clusters,
+            "decimals": decimals,
+        })
+    return runs
+
+
+def load_dump(path, num_coords):
+    """A cluster dump is either a k-means log or raw doubles [numClusters][numCoords]."""
+    raw = Path(path).read_bytes()
+    try:
+        runs = parse_runs(raw.decode("utf-8"))
+    except UnicodeDecodeError:
+        runs = []
+    if any(run["clusters"] is not None for run in runs):
+        return runs
+    if not raw or len(raw) % (DOUBLE * num_coords):
+        return []
+    clusters = np.frombuffer(raw, dtype=np.float64)
+    return [{"header": None, "nloops": None, "clusters": clusters.reshape(-1, num_coords), "decimals": None}]
+
+
+def compare_clusters(reference, clusters, eps, decimals):
+    """
+    Pairs every reference center with the closest unused center of the run
+    (the versions keep the cluster order, but nothing requires it) and
+    checks each coordinate against eps relative error. Printed logs also
+    get half a unit of their last printed digit.
+    """
+    if clusters.shape != reference.shape:
+        return [f"shape {clusters.shape} instead of {reference.shape}"]
+    slack = 0.5 * 10.0 ** -decimals if decimals is not None else 0.0
+    unused = list(range(len(clusters)))
+    errors = []
+    for i, center in enumerate(reference):
+        best = min(unused, key=lambda k: (np.abs(clusters[k] - center).max(), k != i))
+        unused.remove(best)
+        bad = np.abs(clusters[best] - center) > eps * np.abs(center) + slack
+        for j in np.flatnonzero(bad):
+            errors.append(f"cluster[{i}][{j}]: {clusters[best][j]:f} instead of {center[j]:f}")
+    return errors
+
+
+def check_dumps(paths, reference, loops, eps):
+    num_coords = reference["header"][1]
+    failed = 0
+    for path in paths:
+        try:
+            runs = [run for run in load_dump(path, num_coords) if run["clusters"] is not None]
+        except OSError as exc:
+            print(f"{path}: {exc.strerror}")
+            failed += 1
+            continue
+        if not runs:
+            print(f"{path}: no cluster centers found")
+            failed += 1
+            continue
+        for idx, run in enumerate(runs, start=1):
+            label = str(path) if len(runs) == 1 else f"{path} run {idx}"
+            if run["header"] is not None and run["header"] != reference["header"]:
+                print(f"{label}: skipped (numObjs/numCoords/numClusters = {run['header']})")
+                continue
+            errors = compare_clusters(reference["clusters"], run["clusters"], eps, run["decimals"])
+            note = ""
+            if run["nloops"] is not None and run["nloops"] != loops:
+                note = f" (nloops = {run['nloops']}, reference {loops})"
+            if errors:
+                failed += 1
+                print(f"{label}: FAILED{note}")
+                for error in errors[:10]:
+                    print(f"  {error}")
+                if len(errors) > 10:
+                    print(f"  ... {len(errors) - 10} more")
+            else:
+                print(f"{label}: PASSED{note}")
+    return failed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="NumPy reference of seq_kmeans.c for offline validation.")
+    parser.add_argument("-c", dest="clusters", type=int, required=True, help="number of clusters (must be > 1)")
+    parser.add_argument("-s", dest="size", type=float, help="dataset size in MB (generated as in file_io.c)")
+    parser.add_argument("-n", dest="coords", type=int, required=True, help="number of coordinates")
+    parser.add_argument("-t", dest="threshold", type=float, default=0.001, help="threshold value (default: 0.001)")
+    parser.add_argument("-l", dest="loops", type=int, default=10, help="iterations threshold (default: 10)")
+    parser.add_argument("-i", "--input", type=Path, help="read the objects from raw doubles instead of -s")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes for the distance chunks")
+    parser.add_argument("--chunk", type=int, help="objects per distance chunk")
+    parser.add_argument("--dump-objects", type=Path, help="write the objects as raw doubles")
+    parser.add_argument("--dump-clusters", type=Path, help="write the final centers as raw doubles")
+    parser.add_argument("--check", type=Path, nargs="+", default=[], help="logs or raw center dumps to validate")
+    parser.add_argument("--eps", type=float, default=VALIDATION_EPS, help="relative tolerance for --check")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print every loop and center")
+    args = parser.parse_args(argv)
+    if args.clusters <= 1:
+        parser.error("-c must be > 1")
+    if (args.size is None) == (args.input is None):
+        parser.error("give exactly one of -s and -i")
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.input:
+        objects = load_objects(args.input, args.coords)
+        dataset_size = objects.nbytes / (1024.0 * 1024.0)
+    else:
+        dataset_size = args.size
+        objects = dataset_generation(num_objects(args.size, args.coords), args.coords)
+    num_objs = objects.shape[0]
+    if num_objs < args.clusters:
+        print("Error: number of clusters must be larger than the number of data points to be clustered.")
+        return 1
+    print(
+        f"dataset_size = {dataset_size:.2f} MB    numObjs = {num_objs}    "
+        f"numCoords = {args.coords}    numClusters = {args.clusters}"
+    )
+    if initial_clusters(objects, args.clusters) is None:
+        print("Error: some initial clusters are repeated. Please select distinct initial centers")
+        return 1
+    if args.dump_objects:
+        np.ascontiguousarray(objects).tofile(args.dump_objects)
+
+    started = time.perf_counter()
+    clusters, _, loops, timings = kmeans(
+        objects, args.clusters, args.threshold, args.loops, args.jobs, args.chunk, verbose=not args.quiet
+    )
+    total = time.perf_counter() - started
+    print(
+        f"nloops = {loops}  : total = {1000 * total:f} ms\n"
+        f"\t-> t_loop_avg = {1000 * total / loops:f} ms\n"
+        f"\t-> t_loop_min = {1000 * min(timings):f} ms\n"
+        f"\t-> t_loop_max = {1000 * max(timings):f} ms"
+    )
+    if not args.quiet:
+        print("\nFinal cluster centers:")
+        print_clusters(clusters)
+    if args.dump_clusters:
+        clusters.tofile(args.dump_clusters)
+    if args.check:
+        reference = {"header": (num_objs, args.coords, args.clusters), "clusters": clusters}
+        print()
+        if check_dumps(args.check, reference, loops, args.eps):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -29,7 +29,8 @@ static void usage(const char *argv0) {
         "       -d                 : enable debug mode\n"
         "       -h                 : print this help information\n"
         "GPU extras:\n"
-        "       -b                 : blocksize\n";
+        "       -b                 : blocksize\n"
+        "       -o file            : write the final cluster centers to file (raw doubles)\n";
     fprintf(stderr, help, argv0);
     exit(-1);
 }
@@ -41,6 +42,7 @@ int main(int argc, char **argv)
     extern int optind;
 
 	int block_size = 0; 
+    char *clusters_file = NULL;
 	
     long    numClusters=0, numCoords=0, numObjs=0;
     int   * membership;    // [numObjs]
@@ -57,10 +59,12 @@ int main(int argc, char **argv)
 
     printf("\n~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n\n");
 
-    while ( (opt = getopt(argc,argv,"b:n:t:l:c:s:dh")) != EOF) {
+    while ( (opt = getopt(argc,argv,"b:n:t:l:c:s:o:dh")) != EOF) {
         switch (opt) {
             case 'b': block_size = atol(optarg);
                       break;
+            case 'o': clusters_file = optarg;
+                      break;
             case 'c': numClusters = atol(optarg);
                       break;
             case 't': threshold=atof(optarg);
@@ -137,6 +141,14 @@ int main(int argc, char **argv)
     kmeans_gpu(objects, numCoords, numObjs, numClusters, threshold, loop_threshold, membership, clusters, block_size);
     printf("\n");
 
+    // Raw [numClusters][numCoords] doubles, checked offline by kmeans_ref.py --check
+    if (clusters_file) {
+        FILE *fp = fopen(clusters_file, "wb");
+        if (!fp || fwrite(clusters, sizeof(double), numClusters * numCoords, fp) != (size_t) (numClusters * numCoords))
+            error("Could not write cluster centers to %s\n", clusters_file);
+        fclose(fp);
+    }
+
     
     //printf("Final cluster centers:\n");
     //for (i=0; i<numClusters; i++) {
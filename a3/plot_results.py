@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import re
+import shutil
+import sys
 from pathlib import Path
 
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+import profiling
 
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -85,15 +91,127 @@ def load_version_data():
     return data
 
 
-def plot_stacked_bar(version, coords, seq_time, data, out_dir):
-    plot_stacked_bar_internal(version, coords, seq_time, data, out_dir, include_sequential=True)
+# Figures are rendered through templates: each plot kind builds its figure,
+# axes and artists once and later plots only update the artist data. This
+# avoids pyplot's global state and the per-figure layout passes.
+FIGURE_DPI = 200
+STACKED_BAR_LAYOUT = {"left": 0.07, "right": 0.98, "bottom": 0.11, "top": 0.92}
+METRIC_BAR_LAYOUT = {"left": 0.1, "right": 0.97, "bottom": 0.12, "top": 0.91}
+SPEEDUP_LAYOUT = {"left": 0.1, "right": 0.97, "bottom": 0.11, "top": 0.92}
+
+_templates = {}
+
+
+def new_figure(figsize, layout):
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    fig.subplots_adjust(**layout)
+    ax.grid(axis="y", alpha=0.3)
+    return fig, ax
 
 
-def plot_stacked_bar_gpu_only(version, coords, data, out_dir):
-    plot_stacked_bar_internal(version, coords, None, data, out_dir, include_sequential=False)
+def save_figure(fig, out_paths):
+    # Identical figures are encoded once and copied to the other locations.
+    first, *rest = out_paths
+    with profiling.span("save", figure=first.name, copies=len(rest)):
+        fig.savefig(first, dpi=FIGURE_DPI)
+        for path in rest:
+            shutil.copyfile(first, path)
 
 
-def plot_stacked_bar_internal(version, coords, seq_time, data, out_dir, include_sequential):
+def set_ylim(ax, max_value):
+    ax.set_ylim(0.0, max_value * 1.1 if max_value > 0.0 else 1.0)
+
+
+def set_bar_labels(texts, bars, values, fontsize, rotation=0):
+    max_value = max(values) if values else 0.0
+    offset = max(0.02, max_value * 0.02)
+    for text, bar, value in zip(texts, bars, values):
+        text.set_position((bar.get_x() + bar.get_width() / 2.0, value + offset))
+        text.set_text(f"{value:.2f}")
+        text.set_fontsize(fontsize)
+        text.set_rotation(rotation)
+        text.set_visible(True)
+
+
+def new_value_labels(ax, count):
+    return [
+        ax.text(0.0, 0.0, "", ha="center", va="bottom", fontweight="bold", visible=False)
+        for _ in range(count)
+    ]
+
+
+def stacked_bar_template(x_labels):
+    key = ("stacked_bar", tuple(x_labels))
+    if key in _templates:
+        return _templates[key]
+    fig, ax = new_figure((11, 5), STACKED_BAR_LAYOUT)
+    x = list(range(len(x_labels)))
+    zeros = [0.0] * len(x_labels)
+    bar_width = 0.5
+    series = [
+        ax.bar(x, zeros, width=bar_width, label="GPU time", color="#1f77b4"),
+        ax.bar(x, zeros, width=bar_width, label="Transfer time", color="#ff7f0e"),
+        ax.bar(x, zeros, width=bar_width, label="CPU time", color="#2ca02c"),
+    ]
+    ax.set_xticks(x, x_labels)
+    ax.set_xlabel("Configuration")
+    ax.set_ylabel("Time (ms)")
+    ax.legend()
+    template = {"fig": fig, "ax": ax, "series": series}
+    _templates[key] = template
+    return template
+
+
+def metric_bar_template(color, ylabel):
+    key = ("metric_bar", color, ylabel)
+    if key in _templates:
+        return _templates[key]
+    fig, ax = new_figure((8, 4.5), METRIC_BAR_LAYOUT)
+    x = list(range(len(DISPLAY_BLOCKS)))
+    bars = ax.bar(x, [0.0] * len(x), width=0.5, color=color)
+    ax.set_xticks(x, [str(b) for b in DISPLAY_BLOCKS])
+    ax.set_xlabel("Block size")
+    ax.set_ylabel(ylabel)
+    template = {"fig": fig, "ax": ax, "bars": bars, "labels": new_value_labels(ax, len(x))}
+    _templates[key] = template
+    return template
+
+
+def speedup_template():
+    key = ("speedup",)
+    if key in _templates:
+        return _templates[key]
+    fig, ax = new_figure((8, 5), SPEEDUP_LAYOUT)
+    lines = [
+        ax.plot([], [], marker="o", color=f"C{idx}", visible=False)[0]
+        for idx in range(len(VERSIONS))
+    ]
+    ax.axhline(1.0, linestyle=":", color="gray", linewidth=1)
+    ax.set_xlabel("Block size")
+    ax.set_ylabel("Speedup (seq_time / time)")
+    ax.set_xticks(list(range(len(DISPLAY_BLOCKS))), [str(b) for b in DISPLAY_BLOCKS])
+    template = {
+        "fig": fig,
+        "ax": ax,
+        "lines": lines,
+        "labels": [new_value_labels(ax, len(DISPLAY_BLOCKS)) for _ in lines],
+    }
+    _templates[key] = template
+    return template
+
+
+def plot_stacked_bar(version, coords, seq_time, data, out_dirs):
+    plot_stacked_bar_internal(version, coords, seq_time, data, out_dirs, include_sequential=True)
+
+
+def plot_stacked_bar_gpu_only(version, coords, data, out_dirs):
+    plot_stacked_bar_internal(version, coords, None, data, out_dirs, include_sequential=False)
+
+
+@profiling.traced("render")
+def plot_stacked_bar_internal(version, coords, seq_time, data, out_dirs, include_sequential):
     label = VERSIONS[version]["label"]
     blocks = sorted(data.get(coords, {}).keys())
     if not blocks:
@@ -108,42 +226,35 @@ def plot_stacked_bar_internal(version, coords, seq_time, data, out_dir, include_
         gpu = []
         transfers = []
         cpu = []
-    for block in DISPLAY_BLOCKS:
-        timings = data[coords].get(block)
-        gpu.append((timings or {}).get("gpu") or 0.0)
-        transfers.append((timings or {}).get("transfers") or 0.0)
-        cpu.append((timings or {}).get("cpu") or 0.0)
-
-    x = list(range(len(x_labels)))
-    plt.figure(figsize=(11, 5))
-    bar_width = 0.5
-    plt.bar(x, gpu, width=bar_width, label="GPU time", color="#1f77b4")
-    plt.bar(x, transfers, width=bar_width, bottom=gpu, label="Transfer time", color="#ff7f0e")
-    bottom = [g + t for g, t in zip(gpu, transfers)]
-    plt.bar(x, cpu, width=bar_width, bottom=bottom, label="CPU time", color="#2ca02c")
-    plt.xticks(x, x_labels)
-    plt.xlabel("Configuration")
-    plt.ylabel("Time (ms)")
+    with profiling.span("aggregate"):
+        for block in DISPLAY_BLOCKS:
+            timings = data[coords].get(block)
+            gpu.append((timings or {}).get("gpu") or 0.0)
+            transfers.append((timings or {}).get("transfers") or 0.0)
+            cpu.append((timings or {}).get("cpu") or 0.0)
+
+    template = stacked_bar_template(x_labels)
+    ax = template["ax"]
+    bottom = [0.0] * len(x_labels)
+    for bars, values in zip(template["series"], (gpu, transfers, cpu)):
+        for bar, value, base in zip(bars, values, bottom):
+            bar.set_y(base)
+            bar.set_height(value)
+        bottom = [b + v for b, v in zip(bottom, values)]
     if include_sequential:
         title_suffix = "Execution Time"
     else:
         title_suffix = "Execution Time (GPU-only)"
-    plt.title(f"{label} {title_suffix} (coords={coords})")
-    max_total = max((g + t + c for g, t, c in zip(gpu, transfers, cpu)), default=0.0)
-    if max_total > 0.0:
-        plt.ylim(0.0, max_total * 1.1)
-    plt.grid(axis="y", alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
+    ax.set_title(f"{label} {title_suffix} (coords={coords})")
+    set_ylim(ax, max(bottom, default=0.0))
     if include_sequential:
         out_name = f"bar_{version}_coords{coords}.png"
     else:
         out_name = f"bar_{version}_coords{coords}_gpu_only.png"
-    out_path = out_dir / out_name
-    plt.savefig(out_path, dpi=200)
-    plt.close()
+    save_figure(template["fig"], [out_dir / out_name for out_dir in out_dirs])
 
 
+@profiling.traced("render")
 def plot_metric_bars(version, coords, data, out_dir):
     label = VERSIONS[version]["label"]
     version_data = data.get(coords, {})
@@ -156,150 +267,127 @@ def plot_metric_bars(version, coords, data, out_dir):
         ("cpu", "CPU time"),
         ("loop", "Total loop time"),
     ]
+    template = metric_bar_template("#1f77b4", "Time (ms)")
+    ax = template["ax"]
     for metric_key, metric_label in metrics:
         values = [(version_data.get(b) or {}).get(metric_key) or 0.0 for b in DISPLAY_BLOCKS]
-        plt.figure(figsize=(8, 4.5))
-        bar_width = 0.5
-        x = list(range(len(DISPLAY_BLOCKS)))
-        bars = plt.bar(x, values, width=bar_width, color="#1f77b4")
-        plt.xticks(x, [str(b) for b in DISPLAY_BLOCKS])
-        plt.xlabel("Block size")
-        plt.ylabel("Time (ms)")
-        plt.title(f"{label} {metric_label} (coords={coords})")
-        max_value = max(values) if values else 0.0
-        if max_value > 0.0:
-            plt.ylim(0.0, max_value * 1.1)
-        plt.grid(axis="y", alpha=0.3)
+        for bar, value in zip(template["bars"], values):
+            bar.set_height(value)
+        ax.set_title(f"{label} {metric_label} (coords={coords})")
+        set_ylim(ax, max(values) if values else 0.0)
         if metric_key == "transfers":
-            annotate_bar_values(bars, values)
-        plt.tight_layout()
-        out_path = out_dir / f"coords{coords}_metric_{metric_key}.png"
-        plt.savefig(out_path, dpi=200)
-        plt.close()
+            annotate_bar_values(template, values)
+        save_figure(template["fig"], [out_dir / f"coords{coords}_metric_{metric_key}.png"])
+        for text in template["labels"]:
+            text.set_visible(False)
         if metric_key == "transfers":
             plot_transfer_deltas(label, coords, values, out_dir)
 
 
-def annotate_speedups(x_vals, speedups):
+def annotate_speedups(texts, x_vals, speedups):
     if not speedups:
         return
     max_val = max(speedups)
     offset = max(0.02, max_val * 0.02)
-    for x_val, speedup in zip(x_vals, speedups):
-        plt.text(
-            x_val,
-            speedup + offset,
-            f"{speedup:.2f}",
-            ha="center",
-            va="bottom",
-            fontsize=8,
-            fontweight="bold",
-        )
+    for text, x_val, speedup in zip(texts, x_vals, speedups):
+        text.set_position((x_val, speedup + offset))
+        text.set_text(f"{speedup:.2f}")
+        text.set_fontsize(8)
+        text.set_visible(True)
 
 
-def annotate_bar_values(bars, values):
-    max_value = max(values) if values else 0.0
-    offset = max(0.02, max_value * 0.02)
-    for bar, value in zip(bars, values):
-        plt.text(
-            bar.get_x() + bar.get_width() / 2.0,
-            value + offset,
-            f"{value:.2f}",
-            ha="center",
-            va="bottom",
-            fontsize=7,
-            fontweight="bold",
-            rotation=90,
-        )
+def annotate_bar_values(template, values):
+    set_bar_labels(template["labels"], template["bars"], values, fontsize=7, rotation=90)
 
 
+@profiling.traced("render")
 def plot_transfer_deltas(label, coords, values, out_dir):
     if not values:
         return
     min_value = min(values)
     deltas = [v - min_value for v in values]
-    plt.figure(figsize=(8, 4.5))
-    bar_width = 0.5
-    x = list(range(len(DISPLAY_BLOCKS)))
-    plt.bar(x, deltas, width=bar_width, color="#9467bd")
-    plt.xticks(x, [str(b) for b in DISPLAY_BLOCKS])
-    plt.xlabel("Block size")
-    plt.ylabel("Delta vs min (ms)")
-    plt.title(f"{label} Transfer Delta (coords={coords})")
-    max_delta = max(deltas) if deltas else 0.0
-    if max_delta > 0.0:
-        plt.ylim(0.0, max_delta * 1.1)
-    plt.grid(axis="y", alpha=0.3)
-    plt.tight_layout()
-    out_path = out_dir / f"coords{coords}_metric_transfers_delta.png"
-    plt.savefig(out_path, dpi=200)
-    plt.close()
+    template = metric_bar_template("#9467bd", "Delta vs min (ms)")
+    ax = template["ax"]
+    for bar, delta in zip(template["bars"], deltas):
+        bar.set_height(delta)
+    ax.set_title(f"{label} Transfer Delta (coords={coords})")
+    set_ylim(ax, max(deltas) if deltas else 0.0)
+    save_figure(template["fig"], [out_dir / f"coords{coords}_metric_transfers_delta.png"])
+
+
+@profiling.traced("render")
+def draw_speedups(title, coords, seq_time, data, versions, annotate_version, out_path):
+    template = speedup_template()
+    ax = template["ax"]
+    x_positions = {block: idx for idx, block in enumerate(DISPLAY_BLOCKS)}
+    handles = []
+    for line, texts in zip(template["lines"], template["labels"]):
+        line.set_visible(False)
+        for text in texts:
+            text.set_visible(False)
+    for version in versions:
+        version_data = data.get(version, {}).get(coords, {})
+        if not version_data:
+            continue
+        with profiling.span("aggregate", version=version):
+            blocks = sorted(version_data.keys())
+            speedups = [seq_time / version_data[b]["loop"] for b in blocks]
+            x_vals = [x_positions[b] for b in blocks if b in x_positions]
+            speedups = [speedups[i] for i, b in enumerate(blocks) if b in x_positions]
+        slot = len(handles)
+        line = template["lines"][slot]
+        line.set_data(x_vals, speedups)
+        line.set_label(VERSIONS[version]["label"])
+        line.set_visible(True)
+        handles.append(line)
+        if annotate_version is None or version == annotate_version:
+            annotate_speedups(template["labels"][slot], x_vals, speedups)
+    if not handles:
+        return
+    ax.set_title(title)
+    ax.relim(visible_only=True)
+    ax.autoscale_view()
+    ax.legend(handles=handles)
+    save_figure(template["fig"], [out_path])
 
 
 def plot_speedup_single(version, coords, seq_time, data, out_dir):
     label = VERSIONS[version]["label"]
-    version_data = data.get(coords, {})
-    blocks = sorted(version_data.keys())
-    if not blocks:
+    if not data.get(coords):
         return
-    speedups = [seq_time / version_data[b]["loop"] for b in blocks]
-    x_positions = {block: idx for idx, block in enumerate(DISPLAY_BLOCKS)}
-    x_vals = [x_positions[b] for b in blocks if b in x_positions]
-    speedups = [speedups[i] for i, b in enumerate(blocks) if b in x_positions]
-    plt.figure(figsize=(8, 5))
-    plt.plot(x_vals, speedups, marker="o", label=label)
-    plt.xlabel("Block size")
-    plt.ylabel("Speedup (seq_time / time)")
-    plt.title(f"{label} Speedup (coords={coords})")
-    plt.axhline(1.0, linestyle=":", color="gray", linewidth=1)
-    annotate_speedups(x_vals, speedups)
-    plt.xticks(list(range(len(DISPLAY_BLOCKS))), [str(b) for b in DISPLAY_BLOCKS])
-    plt.grid(axis="y", alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    out_path = out_dir / f"coords{coords}_speedup.png"
-    plt.savefig(out_path, dpi=200)
-    plt.close()
+    draw_speedups(
+        f"{label} Speedup (coords={coords})",
+        coords,
+        seq_time,
+        {version: data},
+        [version],
+        None,
+        out_dir / f"coords{coords}_speedup.png",
+    )
 
 
 def plot_speedup(plot_name, coords, seq_time, data, versions, annotate_last_only=True):
-    plt.figure(figsize=(8, 5))
-    x_positions = {block: idx for idx, block in enumerate(DISPLAY_BLOCKS)}
-    plotted = False
     annotate_version = versions[-1] if versions and annotate_last_only else None
-    for version in versions:
-        version_data = data.get(version, {}).get(coords, {})
-        if not version_data:
-            continue
-        blocks = sorted(version_data.keys())
-        speedups = [seq_time / version_data[b]["loop"] for b in blocks]
-        x_vals = [x_positions[b] for b in blocks if b in x_positions]
-        speedups = [speedups[i] for i, b in enumerate(blocks) if b in x_positions]
-        label = VERSIONS[version]["label"]
-        plt.plot(x_vals, speedups, marker="o", label=label)
-        if annotate_version is None or version == annotate_version:
-            annotate_speedups(x_vals, speedups)
-        plotted = True
-    if not plotted:
-        plt.close()
-        return
-    plt.xlabel("Block size")
-    plt.ylabel("Speedup (seq_time / time)")
-    plt.title(f"Speedup (coords={coords})")
-    plt.axhline(1.0, linestyle=":", color="gray", linewidth=1)
-    plt.xticks(list(range(len(DISPLAY_BLOCKS))), [str(b) for b in DISPLAY_BLOCKS])
-    plt.grid(axis="y", alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    out_path = PLOTS_DIR / f"{plot_name}_coords{coords}.png"
-    plt.savefig(out_path, dpi=200)
-    plt.close()
-
-
-def main():
+    draw_speedups(
+        f"Speedup (coords={coords})",
+        coords,
+        seq_time,
+        data,
+        versions,
+        annotate_version,
+        PLOTS_DIR / f"{plot_name}_coords{coords}.png",
+    )
+
+
+def main(argv):
+    argv = profiling.configure(argv)
+    if argv:
+        print("usage: plot_results.py [--profile[=TRACE]] [--cprofile] [--tracemalloc]")
+        return 1
     PLOTS_DIR.mkdir(exist_ok=True)
-    seq_times = load_seq_times()
-    data = load_version_data()
+    with profiling.span("parse"):
+        seq_times = load_seq_times()
+        data = load_version_data()
 
     for coords in COORDS:
         if coords not in seq_times:
@@ -309,10 +397,9 @@ def main():
             version_dir = BASE_DIR / VERSIONS[version]["folder"]
             version_plots = version_dir / "plots"
             version_plots.mkdir(exist_ok=True)
-            plot_stacked_bar(version, coords, seq_time, data.get(version, {}), PLOTS_DIR)
-            plot_stacked_bar(version, coords, seq_time, data.get(version, {}), version_plots)
-            plot_stacked_bar_gpu_only(version, coords, data.get(version, {}), PLOTS_DIR)
-            plot_stacked_bar_gpu_only(version, coords, data.get(version, {}), version_plots)
+            out_dirs = [PLOTS_DIR, version_plots]
+            plot_stacked_bar(version, coords, seq_time, data.get(version, {}), out_dirs)
+            plot_stacked_bar_gpu_only(version, coords, data.get(version, {}), out_dirs)
             plot_metric_bars(version, coords, data.get(version, {}), version_plots)
             plot_speedup_single(version, coords, seq_time, data.get(version, {}), version_plots)
 
@@ -339,7 +426,8 @@ def main():
             data,
             ["naive", "transpose", "shared_mem", "all_gpu", "reduction", "all_gpu_all_reduction"],
         )
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import argparse
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+from plot_results import BASE_DIR, COORDS, PLOTS_DIR, VERSIONS, new_figure, save_figure
+from results import load_results
+
+
+# Tesla V100 (PCIe) peaks; override them for other GPUs from the command line.
+PEAK_BANDWIDTH = 900.0  # HBM2, GB/s
+PEAK_GFLOPS = 7000.0  # FP64, GFLOP/s
+PEAK_PCIE = 15.75  # PCIe 3.0 x16, GB/s per direction
+
+DOUBLE = 8
+INT = 4
+ROOFLINE_LAYOUT = {"left": 0.1, "right": 0.97, "bottom": 0.1, "top": 0.93}
+COORDS_MARKERS = {2: "o", 32: "^"}
+# Smaller copies per iteration (e.g. the 8-byte delta) are latency-bound:
+# t_transfers says nothing about the bandwidth they reach.
+PCIE_MIN_BYTES = 1 << 20
+
+
+def traffic_model(version, objs, coords, clusters, block_size):
+    """
+    Bytes and FLOPs of one k-means iteration of a kernel variant.
+
+    "dram" counts every array the kernels touch once (compulsory traffic),
+    "cache" counts the global loads as issued by the threads, i.e. an
+    object is read again for every cluster it is compared with. The
+    truth lies in between, depending on how much of it L1/L2 absorb.
+    "h2d"/"d2h" are the PCIe copies timed in t_transfers.
+    """
+    blocks = -(-objs // block_size)
+    centers = clusters * coords * DOUBLE
+    distances = objs * clusters * coords
+    model = {
+        # diff, multiply and add per coordinate of every object-cluster pair
+        "flops": 3 * distances,
+        "dram": objs * coords * DOUBLE + 2 * objs * INT + centers,
+        "cache": 2 * distances * DOUBLE + 2 * objs * INT,
+        "h2d": centers,
+        "d2h": objs * INT + DOUBLE,
+    }
+    if version in ("naive", "transpose"):
+        return model
+    # Clusters come from shared memory: each block loads them once.
+    model["cache"] = distances * DOUBLE + blocks * centers + 2 * objs * INT
+    if version == "shared_mem":
+        return model
+    # The centroid update moved to the GPU: a sum per coordinate of every
+    # object, atomics (or per-block partial sums) on the new clusters and a
+    # division per center. Only delta crosses PCIe inside the loop.
+    model["flops"] += objs * coords + clusters * coords
+    model["h2d"] = 0
+    model["d2h"] = DOUBLE
+    update = objs * coords * DOUBLE + objs * INT
+    averages = 2 * centers + clusters * INT
+    if version == "all_gpu":
+        # update_centroids is a separate kernel and reads everything again.
+        model["dram"] += update + averages
+        model["cache"] += update + objs * INT + averages
+    elif version == "reduction":
+        # Fused into find_nearest_cluster: the objects are already cached.
+        model["dram"] += averages
+        model["cache"] += update + averages
+    elif version == "all_gpu_all_reduction":
+        # Every block writes its partial sums, reduce_blocks reads them back.
+        partials = blocks * (centers + clusters * INT + DOUBLE)
+        model["dram"] += 2 * partials + 2 * averages
+        model["cache"] += objs * coords * DOUBLE + 2 * partials + 2 * averages
+    return model
+
+
+def median(values):
+    return statistics.median(values) if values else None
+
+
+def load_points(base_dir):
+    # The logs are parsed by tools/results.py, where the version is the folder name.
+    folders = {meta["folder"]: version for version, meta in VERSIONS.items()}
+    points = []
+    for entry in load_results(base_dir).values():
+        config = entry["config"]
+        version = folders.get(config["version"])
+        gpu = entry["samples"].get("gpu")
+        if version is None or config["block_size"] is None or not gpu or not entry["objects"]:
+            continue
+        points.append({
+            "version": version,
+            "block_size": config["block_size"],
+            "objs": entry["objects"],
+            "coords": config["coords"],
+            "clusters": config["clusters"],
+            "runs": len(gpu),
+            **{name: median(entry["samples"].get(name)) for name in ("loop", "gpu", "transfers")},
+        })
+    return points
+
+
+def analyze(point, peaks):
+    model = traffic_model(point["version"], point["objs"], point["coords"], point["clusters"], point["block_size"])
+    gpu_s = point["gpu"] / 1000.0
+    pcie_bytes = model["h2d"] + model["d2h"]
+    analysis = {
+        "intensity": model["flops"] / model["dram"],
+        "cache_intensity": model["flops"] / model["cache"],
+        "gflops": model["flops"] / gpu_s / 1e9,
+        "bandwidth": model["dram"] / gpu_s / 1e9,
+        "cache_bandwidth": model["cache"] / gpu_s / 1e9,
+        "pcie_bytes": pcie_bytes,
+        "pcie": None,
+    }
+    analysis["roof"] = min(peaks["gflops"], analysis["intensity"] * peaks["bandwidth"])
+    if point["transfers"] and pcie_bytes >= PCIE_MIN_BYTES:
+        analysis["pcie"] = pcie_bytes / (point["transfers"] / 1000.0) / 1e9
+    return analysis
+
+
+def best_points(points):
+    best = {}
+    for point in points:
+        key = (point["version"], point["coords"])
+        if key not in best or point["gpu"] < best[key]["gpu"]:
+            best[key] = point
+    return list(best.values())
+
+
+def format_size(num_bytes):
+    for unit in ("B", "KiB", "MiB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024.0
+    return f"{num_bytes:.0f} GiB"
+
+
+def share(value, peak, width, digits, cause):
+    """
+    value and its percentage of peak. Above peak the model is off, not the
+    hardware, so the value is starred and the percentage names the cause.
+    """
+    if value <= peak:
+        return f"{value:>{width}.{digits}f} {100 * value / peak:>5.1f}%"
+    return f"{value:>{width - 1}.{digits}f}* {cause + '*':>6}"
+
+
+def print_table(points, peaks):
+    print(
+        f"{'version':<22} {'coords':>6} {'block':>5} {'t_gpu ms':>9} {'GB/s':>7} {'%peak':>6} "
+        f"{'FLOP/B':>7} {'GFLOP/s':>8} {'%roof':>6} {'PCIe/iter':>10} {'PCIe GB/s':>9} {'%pcie':>6}"
+    )
+    causes = set()
+    for point in points:
+        a = point["analysis"]
+        if a["pcie"] is not None:
+            pcie = share(a["pcie"], peaks["pcie"], 9, 3, "model")
+        elif point["transfers"] and a["pcie_bytes"]:
+            pcie = f"{'n/a':>9} {'n/a':>6}"
+        else:
+            pcie = f"{'-':>9} {'-':>6}"
+        columns = [
+            share(a["bandwidth"], peaks["bandwidth"], 7, 1, "cache"),
+            f"{a['intensity']:>7.2f}",
+            share(a["gflops"], a["roof"], 8, 1, "cache"),
+        ]
+        causes.update(word for word in ("cache", "model") if f"{word}*" in " ".join(columns + [pcie]))
+        print(
+            f"{point['version']:<22} {point['coords']:>6} {point['block_size']:>5} {point['gpu']:>9.3f} "
+            f"{' '.join(columns)} {format_size(a['pcie_bytes']):>10} {pcie}"
+        )
+    if causes:
+        print()
+    if "cache" in causes:
+        print(
+            "cache*: above the DRAM peak or roof. The model counts DRAM bytes that L1/L2 served, "
+            "so this is not achieved DRAM throughput."
+        )
+    if "model" in causes:
+        print(
+            "model*: above the PCIe peak. t_transfers does not cover the whole modelled copy volume, "
+            "so this is not achieved PCIe throughput."
+        )
+    if any(p["analysis"]["pcie"] is None and p["transfers"] and p["analysis"]["pcie_bytes"] for p in points):
+        print(f"n/a: less than {format_size(PCIE_MIN_BYTES)} copied per iteration, too little to time the bandwidth.")
+
+
+def plot_roofline(points, peaks, out_path):
+    fig, ax = new_figure((9, 6), ROOFLINE_LAYOUT)
+    ax.grid(which="both", alpha=0.3)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    intensities = [p["analysis"]["intensity"] for p in points] + [p["analysis"]["cache_intensity"] for p in points]
+    ridge = peaks["gflops"] / peaks["bandwidth"]
+    x_min = min(intensities + [ridge]) / 4.0
+    x_max = max(intensities + [ridge]) * 4.0
+    ax.plot([x_min, ridge, x_max], [x_min * peaks["bandwidth"], peaks["gflops"], peaks["gflops"]], color="black")
+    ax.text(
+        x_min * 1.2,
+        x_min * 1.2 * peaks["bandwidth"] * 1.6,
+        f"HBM {peaks['bandwidth']:.0f} GB/s",
+        rotation=28,
+        fontsize=8,
+    )
+    ax.text(x_max / 1.2, peaks["gflops"] * 1.1, f"FP64 {peaks['gflops']:.0f} GFLOP/s", ha="right", fontsize=8)
+
+    for idx, (version, meta) in enumerate(VERSIONS.items()):
+        color = f"C{idx}"
+        series = sorted((p for p in points if p["version"] == version), key=lambda p: p["coords"])
+        if not series:
+            continue
+        xs = [p["analysis"]["intensity"] for p in series]
+        ys = [p["analysis"]["gflops"] for p in series]
+        # Link the coords=2 and coords=32 points of the same version.
+        ax.plot(xs, ys, color=color, linestyle=":", linewidth=1)
+        for point, x, y in zip(series, xs, ys):
+            # Above the roof only because the DRAM model ignores cache reuse.
+            face = color if y <= point["analysis"]["roof"] else "none"
+            marker = COORDS_MARKERS.get(point["coords"], "s")
+            ax.scatter(x, y, facecolors=face, edgecolors=color, marker=marker, zorder=3)
+            # The cache-level intensity shows how far L1/L2 reuse moves the point.
+            ax.scatter(point["analysis"]["cache_intensity"], y, color=color, marker="x", alpha=0.5, zorder=3)
+        ax.scatter([], [], color=color, marker="s", label=meta["label"])
+    for coords, marker in COORDS_MARKERS.items():
+        ax.scatter([], [], color="gray", marker=marker, label=f"coords={coords}")
+    ax.scatter([], [], color="gray", marker="x", alpha=0.5, label="without cache reuse")
+    ax.scatter([], [], facecolors="none", edgecolors="gray", marker="o", label="above the roof (cache reuse)")
+    ax.set_xlim(x_min, x_max)
+    ax.set_xlabel("Arithmetic intensity (FLOP/byte of DRAM traffic)")
+    ax.set_ylabel("Achieved GFLOP/s")
+    ax.set_title("K-means roofline (best block size per version)")
+    ax.legend(fontsize=8, ncol=2, loc="lower right")
+    save_figure(fig, [out_path])
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Roofline and bandwidth analysis of the CUDA k-means results.")
+    parser.add_argument("--results", type=Path, default=BASE_DIR, help="directory holding the version folders")
+    parser.add_argument("--peak-bw", type=float, default=PEAK_BANDWIDTH, help="DRAM bandwidth in GB/s")
+    parser.add_argument("--peak-gflops", type=float, default=PEAK_GFLOPS, help="FP64 peak in GFLOP/s")
+    parser.add_argument("--peak-pcie", type=float, default=PEAK_PCIE, help="host-device bandwidth in GB/s")
+    parser.add_argument("--all-blocks", action="store_true", help="list every block size, not only the best")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    peaks = {"bandwidth": args.peak_bw, "gflops": args.peak_gflops, "pcie": args.peak_pcie}
+    points = [p for p in load_points(args.results) if p["coords"] in COORDS]
+    if not points:
+        print(f"No CUDA results found in {args.results}")
+        return 1
+    for point in points:
+        point["analysis"] = analyze(point, peaks)
+    points.sort(key=lambda p: (p["coords"], list(VERSIONS).index(p["version"]), p["block_size"]))
+    best = best_points(points)
+    print_table(points if args.all_blocks else best, peaks)
+    print(
+        f"\nPeaks: {peaks['bandwidth']:.0f} GB/s DRAM, {peaks['gflops']:.0f} GFLOP/s FP64, "
+        f"ridge at {peaks['gflops'] / peaks['bandwidth']:.2f} FLOP/byte, PCIe {peaks['pcie']:.2f} GB/s."
+    )
+    PLOTS_DIR.mkdir(exist_ok=True)
+    out_path = PLOTS_DIR / "roofline.png"
+    plot_roofline(best, peaks, out_path)
+    print(f"Wrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
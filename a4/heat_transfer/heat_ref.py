@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""NumPy reference of the serial and MPI heat transfer solvers."""
+import argparse
+import math
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+# utils.h
+C = 100
+T = 100000000
+E = 0.000001
+CONSTANT_ITERATIONS = 256
+
+DOUBLE = 8
+# Rows per block: small enough for the stencil temporaries to stay in cache.
+BLOCK_BYTES = 256 * 1024
+# Rows per block of a memory-mapped grid, read from disk once per sweep.
+MEMMAP_BLOCK_BYTES = 64 * 1024 * 1024
+# fprint2d() and the result lines print six decimals.
+PRINT_TOLERANCE = 1e-6
+# --predict solves grids up to PREDICT_FROM x PREDICT_FROM (and no smaller than PREDICT_MIN).
+PREDICT_FROM = 128
+PREDICT_MIN = 16
+RED = 0
+BLACK = 1
+
+METHODS = {
+    "jacobi": {"name": "Jacobi", "res": "resJacobi"},
+    "gauss_seidel": {"name": "GaussSeidelSOR", "res": "resGaussSeidelSOR"},
+    "red_black": {"name": "RedBlackSOR", "res": "resRedBlackSOR"},
+}
+METHOD_NAMES = {meta["name"]: method for method, meta in METHODS.items()}
+
+RESULT_RE = re.compile(
+    r"^(Jacobi|GaussSeidelSOR|RedBlackSOR) X (\d+) Y (\d+)(?: Px (\d+) Py (\d+))? Iter (\d+) .*midpoint (\S+)",
+    re.MULTILINE,
+)
+RES_NAME_RE = re.compile(r"^res(Jacobi|GaussSeidelSOR|RedBlackSOR)(?:Naive|MPI)_(\d+)x(\d+)(?:_(\d+)x(\d+))?$")
+
+
+def relaxation(X):
+    return 2.0 / (1 + math.sin(3.14 / X))
+
+
+def init_grid(X, Y, out=None):
+    """init2d(): 0.01 * (i + 1) + 0.001 * (j + 1) on the boundary, 0 inside."""
+    grid = np.zeros((X, Y)) if out is None else out
+    rows = 0.01 * np.arange(1, X + 1)
+    cols = 0.001 * np.arange(1, Y + 1)
+    grid[0, :] = rows[0] + cols
+    grid[X - 1, :] = rows[X - 1] + cols
+    grid[:, 0] = rows + cols[0]
+    grid[:, Y - 1] = rows + cols[Y - 1]
+    return grid
+
+
+def row_blocks(X, block_rows):
+    return [(r0, min(r0 + block_rows, X - 1)) for r0 in range(1, X - 1, block_rows)]
+
+
+def jacobi(prev, cur, r0, r1):
+    cur[..., r0:r1, 1:-1] = (
+        prev[..., r0 - 1:r1 - 1, 1:-1] + prev[..., r0 + 1:r1 + 1, 1:-1]
+        + prev[..., r0:r1, :-2] + prev[..., r0:r1, 2:]
+    ) / 4.0
+
+
+def sor_color(prev, src, cur, r0, r1, color, omega):
+    """RedSOR() (src = prev, color = RED) or BlackSOR() (src = cur, color = BLACK) on rows [r0, r1)."""
+    width = cur.shape[-1]
+    for i0 in range(r0, min(r0 + 2, r1)):
+        # First column with (i + j) % 2 == color in this row parity.
+        j0 = 1 if (i0 + 1) % 2 == color else 2
+        rows = slice(i0, r1, 2)
+        cols = slice(j0, width - 1, 2)
+        old = prev[..., rows, cols]
+        cur[..., rows, cols] = old + (omega / 4.0) * (
+            src[..., i0 - 1:r1 - 1:2, cols] + src[..., i0 + 1:r1 + 1:2, cols]
+            + src[..., rows, j0 - 1:width - 2:2] + src[..., rows, j0 + 1:width:2]
+            - 4.0 * old
+        )
+
+
+def gauss_seidel(prev, cur, r0, r1, omega, keep=None):
+    """
+    GaussSeidel() on rows [r0, r1) as a wavefront: the cells of an
+    anti-diagonal only depend on the previous one, so each diagonal is one
+    strided slice of the flattened rows. Cells where keep is False are left
+    untouched (the MPI replay's boundary and padding).
+    """
+    width = cur.shape[-1]
+    height = r1 - r0
+    lead = cur.shape[:-2]
+    # Whole rows are contiguous, so these are views: writes through c land in cur.
+    c = cur[..., r0 - 1:r1 + 1, :].reshape(lead + (-1,))
+    assert np.shares_memory(c, cur)
+    p = prev[..., r0 - 1:r1 + 1, :].reshape(lead + (-1,))
+    if keep is not None:
+        keep = keep[..., r0 - 1:r1 + 1, :].reshape(lead + (-1,))
+    step = width - 1
+    for d in range(2, height + width - 1):
+        first = max(1, d - (width - 2))
+        last = min(height, d - 1)
+        # Cell (k, d - k) of the block sits at d + k * (width - 1).
+        start = d + first * step
+        stop = d + last * step + 1
+        cells = slice(start, stop, step)
+        old = p[..., cells]
+        new = old + (
+            c[..., start - width:stop - width:step] + p[..., start + width:stop + width:step]
+            + c[..., start - 1:stop - 1:step] + p[..., start + 1:stop + 1:step]
+            - 4 * old
+        ) * omega / 4.0
+        if keep is not None:
+            new = np.where(keep[..., cells], new, c[..., cells])
+        c[..., cells] = new
+
+
+def max_change(prev, cur):
+    """Largest |cur - prev|; NaN is skipped as in converge(), where fabs(NaN) > e is false."""
+    return float(np.fmax.reduce(np.abs(cur - prev), axis=None, initial=0.0))
+
+
+def block_diff(prev, cur, r0, r1):
+    return max_change(prev[r0:r1], cur[r0:r1])
+
+
+def sweep(method, prev, cur, blocks, omega, check):
+    """One iteration over the row blocks; returns max |cur - prev| when check is set."""
+    diff = 0.0
+    if method == "jacobi":
+        for r0, r1 in blocks:
+            jacobi(prev, cur, r0, r1)
+            if check:
+                diff = max(diff, block_diff(prev, cur, r0, r1))
+    elif method == "gauss_seidel":
+        # Rows above the block are final, the ones below still hold prev.
+        for r0, r1 in blocks:
+            gauss_seidel(prev, cur, r0, r1, omega)
+            if check:
+                diff = max(diff, block_diff(prev, cur, r0, r1))
+    else:
+        # Black cells only need the red rows next to them, so the black
+        # sweep of a block can follow the red sweep of the next one and
+        # each block is loaded once per iteration.
+        for idx in range(len(blocks) + 1):
+            if idx < len(blocks):
+                r0, r1 = blocks[idx]
+                sor_color(prev, prev, cur, r0, r1, RED, omega)
+            if idx:
+                b0, b1 = blocks[idx - 1]
+                sor_color(prev, cur, cur, b0, b1, BLACK, omega)
+                if check:
+                    diff = max(diff, block_diff(prev, cur, b0, b1))
+    return diff
+
+
+def allocate(X, Y, workdir):
+    if workdir is None:
+        return init_grid(X, Y), init_grid(X, Y)
+    grids = []
+    for name in ("u_previous", "u_current"):
+        grid = np.memmap(Path(workdir) / f"{name}.dat", dtype=np.float64, mode="w+", shape=(X, Y))
+        # Plain ndarray views: slicing a memmap subclass costs more than the small wavefront updates.
+        grids.append(np.asarray(init_grid(X, Y, out=grid)))
+    return grids
+
+
+def solve(method, X, Y, constant=False, max_iter=T, block_rows=None, workdir=None, interval=C):
+    """Serial solver loop of <Method>_serial.c; interval = 1 finds the exact iteration converge() passes."""
+    if block_rows is None:
+        if workdir is not None:
+            block_rows = max(1, MEMMAP_BLOCK_BYTES // (Y * DOUBLE))
+        elif method == "gauss_seidel":
+            # Each block is a full pass over its diagonals: the fewer the better.
+            block_rows = X
+        else:
+            block_rows = max(1, BLOCK_BYTES // (Y * DOUBLE))
+    blocks = row_blocks(X, block_rows)
+    prev, cur = allocate(X, Y, workdir)
+    omega = relaxation(X)
+    limit = CONSTANT_ITERATIONS if constant else max_iter
+    elapsed = 0.0
+    converged = False
+    t = 0
+    while t < limit and not converged:
+        prev, cur = cur, prev
+        check = not constant and t % interval == 0
+        started = time.perf_counter()
+        diff = sweep(method, prev, cur, blocks, omega, check)
+        elapsed += time.perf_counter() - started
+        if check:
+            converged = diff <= E
+        t += 1
+    return {"grid": cur, "t": t, "converged": converged, "time": elapsed}
+
+
+def decomposition(X, Y, Px, Py):
+    """
+    Local ranges of every block as in the MPI main(): the padded domain is
+    cut into L0 x L1 blocks, computed on [i_min, i_max) x [j_min, j_max) and
+    checked by converge() on [i_min, i_max] x [j_min, j_max] (local indices,
+    ghost cells at 0 and L + 1).
+    """
+    L0 = -(-X // Px)
+    L1 = -(-Y // Py)
+    i = np.arange(L0 + 2)[:, None]
+    j = np.arange(L1 + 2)[None, :]
+    compute = np.zeros((Px, Py, L0 + 2, L1 + 2), dtype=bool)
+    checked = np.zeros_like(compute)
+    for b in range(Px):
+        i_min = 2 if b == 0 else 1
+        i_max = L0 + 1 - (L0 * Px - X) - 1 if b == Px - 1 else L0 + 1
+        for c in range(Py):
+            j_min = 2 if c == 0 else 1
+            j_max = L1 + 1 - (L1 * Py - Y) - 1 if c == Py - 1 else L1 + 1
+            compute[b, c] = (i >= i_min) & (i < i_max) & (j >= j_min) & (j < j_max)
+            checked[b, c] = (i >= i_min) & (i <= i_max) & (j >= j_min) & (j <= j_max)
+    return L0, L1, compute, checked
+
+
+def exchange(blocks):
+    """The four MPI_Sendrecv() halo exchanges; corners are never sent."""
+    blocks[1:, :, 0, 1:-1] = blocks[:-1, :, -2, 1:-1]
+    blocks[:-1, :, -1, 1:-1] = blocks[1:, :, 1, 1:-1]
+    blocks[:, :-1, 1:-1, -1] = blocks[:, 1:, 1:-1, 1]
+    blocks[:, 1:, 1:-1, 0] = blocks[:, :-1, 1:-1, -2]
+
+
+def copy_ghosts(prev, cur):
+    cur[..., 0, :] = prev[..., 0, :]
+    cur[..., -1, :] = prev[..., -1, :]
+    cur[..., :, 0] = prev[..., :, 0]
+    cur[..., :, -1] = prev[..., :, -1]
+
+
+def solve_mpi(method, X, Y, Px, Py, constant=False, max_iter=T):
+    """Replay of <method>_mpi.c on a Px x Py process grid, all blocks at once."""
+    L0, L1, compute, checked = decomposition(X, Y, Px, Py)
+    padded = np.zeros((L0 * Px, L1 * Py))
+    init_grid(X, Y, out=padded[:X, :Y])
+    # Every local array is init2d()'ed (ghosts included) before the scatter.
+    prev = np.empty((Px, Py, L0 + 2, L1 + 2))
+    prev[...] = init_grid(L0 + 2, L1 + 2)
+    prev[:, :, 1:-1, 1:-1] = padded.reshape(Px, L0, Py, L1).transpose(0, 2, 1, 3)
+    cur = prev.copy()
+    # Interior cells outside [i_min, i_max) x [j_min, j_max) (global
+    # boundary, padding) are never written; the unmasked kernels restore them.
+    fixed = np.zeros_like(compute)
+    fixed[:, :, 1:-1, 1:-1] = True
+    fixed &= ~compute
+    fixed_idx = np.flatnonzero(fixed)
+    fixed_values = prev.reshape(-1)[fixed_idx]
+    omega = relaxation(X)
+    limit = CONSTANT_ITERATIONS if constant else max_iter
+    timings = {"computation": 0.0, "convergence": 0.0}
+    started = time.perf_counter()
+    converged = False
+    t = 0
+    while t < limit and not converged:
+        prev, cur = cur, prev
+        exchange(prev)
+        if method != "jacobi":
+            copy_ghosts(prev, cur)
+        computing = time.perf_counter()
+        if method == "jacobi":
+            jacobi(prev, cur, 1, L0 + 1)
+            np.put(cur, fixed_idx, fixed_values)
+        elif method == "gauss_seidel":
+            gauss_seidel(prev, cur, 1, L0 + 1, omega, keep=compute)
+        else:
+            sor_color(prev, prev, cur, 1, L0 + 1, RED, omega)
+            np.put(cur, fixed_idx, fixed_values)
+            exchange(cur)
+            sor_color(prev, cur, cur, 1, L0 + 1, BLACK, omega)
+            np.put(cur, fixed_idx, fixed_values)
+        timings["computation"] += time.perf_counter() - computing
+        if not constant and t % C == 0:
+            checking = time.perf_counter()
+            diff = max_change(prev[checked], cur[checked])
+            timings["convergence"] += time.perf_counter() - checking
+            converged = diff <= E
+        t += 1
+    timings["total"] = time.perf_counter() - started
+    grid = cur[:, :, 1:-1, 1:-1].transpose(0, 2, 1, 3).reshape(L0 * Px, L1 * Py)[:X, :Y]
+    return {"grid": grid, "t": t, "converged": converged, "time": timings}
+
+
+def coarse_sizes(X, Y, largest):
+    """The two largest grids X / 2^k x Y / 2^k that fit in largest x largest."""
+    sizes = []
+    k = 1
+    while min(X, Y) >> k >= PREDICT_MIN:
+        if max(X, Y) >> k <= largest:
+            sizes.append((X >> k, Y >> k))
+        k += 1
+    return sizes[:2]
+
+
+def predict_iterations(method, X, Y, largest=PREDICT_FROM):
+    """
+    Iterations to converge on X x Y, extrapolated from coarser grids with the
+    same aspect ratio: the count grows as a power of the size (close to X^2
+    for Jacobi, X for SOR), measured between the two largest coarse grids.
+    These are checked every iteration so the t % C rounding does not distort
+    the exponent; the prediction is rounded up to the next check, as printed
+    by the serial version. Returns (iter, exponent, coarse runs); grids up
+    to largest are simply solved.
+    """
+    if max(X, Y) <= largest:
+        return solve(method, X, Y)["t"] - 1, None, []
+    runs = [(x, y, solve(method, x, y, interval=1)["t"] - 1) for x, y in coarse_sizes(X, Y, largest)]
+    if len(runs) < 2:
+        return None, None, runs
+    (x0, _, t0), (x1, _, t1) = runs
+    exponent = math.log(t0 / t1) / math.log(x0 / x1)
+    crossing = t0 * (X / x0) ** exponent
+    return C * math.ceil(crossing / C), exponent, runs
+
+
+def result_line(method, X, Y, grid, result):
+    name = METHODS[method]["name"]
+    midpoint = result["grid"][X // 2, Y // 2]
+    if grid is None:
+        return f"{name} X {X} Y {Y} Iter {result['t'] - 1} Time {result['time']:f} midpoint {midpoint:f}"
+    timings = result["time"]
+    line = (
+        f"{name} X {X} Y {Y} Px {grid[0]} Py {grid[1]} Iter {result['t']} "
+        f"ComputationTime {timings['computation']:f} TotalTime {timings['total']:f}"
+    )
+    if method != "jacobi":
+        communication = max(timings["total"] - timings["computation"], 0.0)
+        line += f" CommunicationTime {communication:f} ConvergenceTime {timings['convergence']:f}"
+    return f"{line} midpoint {midpoint:f}"
+
+
+def res_name(method, X, Y, grid):
+    if grid is None:
+        return f"{METHODS[method]['res']}Naive_{X}x{Y}"
+    return f"{METHODS[method]['res']}MPI_{X}x{Y}_{grid[0]}x{grid[1]}"
+
+
+def write_res(path, values, block_rows=1024):
+    """fprint2d(): "%lf " per value, one row per line."""
+    with open(path, "w") as handle:
+        for r0 in range(0, values.shape[0], block_rows):
+            np.savetxt(handle, values[r0:r0 + block_rows], fmt="%f ", delimiter="")
+
+
+def matches(value, reference, tol):
+    """Within tol, or the same inf/NaN (diverged runs print -nan, inf)."""
+    return (np.abs(value - reference) <= tol) | (value == reference) | (np.isnan(value) & np.isnan(reference))
+
+
+def compare_res(path, values, tol):
+    errors = []
+    worst = 0.0
+    with open(path) as handle:
+        for i, line in enumerate(handle):
+            if i >= values.shape[0]:
+                errors.append(f"more than {values.shape[0]} rows")
+                break
+            row = np.array(line.split(), dtype=np.float64)
+            if row.shape[0] != values.shape[1]:
+                errors.append(f"row {i}: {row.shape[0]} values, expected {values.shape[1]}")
+                continue
+            delta = np.abs(row - values[i])
+            worst = max(worst, float(np.fmax.reduce(delta, initial=0.0)))
+            for j in np.flatnonzero(~matches(row, values[i], tol))[:3]:
+                errors.append(f"[{i}][{j}] = {row[j]:f}, reference {values[i, j]:f}")
+        else:
+            if i + 1 < values.shape[0]:
+                errors.append(f"{i + 1} rows, expected {values.shape[0]}")
+    return errors, worst
+
+
+def parse_runs(text):
+    runs = []
+    for match in RESULT_RE.finditer(text):
+        name, X, Y, Px, Py, iters, midpoint = match.groups()
+        grid = (int(Px), int(Py)) if Px else None
+        # T = 256 prints 255 (serial, t - 1) or 256 (MPI, t); converged
+        # runs print a multiple of C (+ 1 for MPI).
+        constant = int(iters) == (CONSTANT_ITERATIONS if grid else CONSTANT_ITERATIONS - 1)
+        runs.append({
+            "config": (METHOD_NAMES[name], int(X), int(Y), grid, constant),
+            "iter": int(iters),
+            "midpoint": float(midpoint),
+        })
+    return runs
+
+
+def check_files(paths, constant, max_iter, tol):
+    """Validate result logs and res* grids against the reference; returns the number of failures."""
+    references = {}
+
+    def reference(config):
+        if config not in references:
+            method, X, Y, grid, is_constant = config
+            if grid is None:
+                references[config] = solve(method, X, Y, is_constant, max_iter)
+            else:
+                references[config] = solve_mpi(method, X, Y, grid[0], grid[1], is_constant, max_iter)
+        return references[config]
+
+    failed = 0
+    logs, grids = [], []
+    for path in paths:
+        (grids if RES_NAME_RE.match(path.name) else logs).append(path)
+    modes = {}
+    for path in logs:
+        try:
+            runs = parse_runs(path.read_text())
+        except OSError as exc:
+            print(f"{path}: {exc.strerror}")
+            failed += 1
+            continue
+        if not runs:
+            print(f"{path}: no result lines found")
+            failed += 1
+            continue
+        for idx, run in enumerate(runs, start=1):
+            label = str(path) if len(runs) == 1 else f"{path} run {idx}"
+            method, X, Y, grid, is_constant = run["config"]
+            modes[(method, X, Y, grid)] = is_constant
+            result = reference(run["config"])
+            iters = result["t"] if grid else result["t"] - 1
+            midpoint = float(result["grid"][X // 2, Y // 2])
+            errors = []
+            if run["iter"] != iters:
+                errors.append(f"Iter {run['iter']}, reference {iters}")
+            if not matches(run["midpoint"], midpoint, tol):
+                errors.append(f"midpoint {run['midpoint']:f}, reference {midpoint:f}")
+            if errors:
+                failed += 1
+                print(f"{label}: FAILED ({'; '.join(errors)})")
+            else:
+                print(f"{label}: PASSED ({METHODS[method]['name']} {X}x{Y}, Iter {iters})")
+    for path in grids:
+        name, X, Y, Px, Py = RES_NAME_RE.match(path.name).groups()
+        grid = (int(Px), int(Py)) if Px else None
+        method = METHOD_NAMES[name]
+        key = (method, int(X), int(Y), grid)
+        result = reference(key + (modes.get(key, constant),))
+        try:
+            errors, worst = compare_res(path, result["grid"], tol)
+        except (OSError, ValueError) as exc:
+            print(f"{path}: {getattr(exc, 'strerror', None) or exc}")
+            failed += 1
+            continue
+        if errors:
+            failed += 1
+            print(f"{path}: FAILED")
+            for error in errors[:10]:
+                print(f"  {error}")
+            if len(errors) > 10:
+                print(f"  ... {len(errors) - 10} more")
+        else:
+            print(f"{path}: PASSED (max difference {worst:.1e})")
+    return failed
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="NumPy reference of the heat transfer solvers.")
+    parser.add_argument("method", nargs="?", choices=sorted(METHODS), help="solver to run")
+    parser.add_argument("size", nargs="*", type=int, help="X [Y] as for the C executables (Y defaults to X)")
+    parser.add_argument("--grid", type=int, nargs=2, metavar=("PX", "PY"), help="replay the MPI version on PX x PY")
+    parser.add_argument("--constant", action="store_true", help=f"run {CONSTANT_ITERATIONS} iterations (no TEST_CONV)")
+    parser.add_argument("--max-iter", type=int, default=T, help="iteration cap of the convergence loop")
+    parser.add_argument("--block-rows", type=int, help="rows updated per block (serial only)")
+    parser.add_argument("--memmap", type=Path, help="keep both grids in memory-mapped files under this directory")
+    parser.add_argument("--res", type=Path, help="write the final grid like PRINT_RESULTS (a directory uses the C name)")
+    parser.add_argument("--predict", action="store_true", help="estimate Iter of the TEST_CONV run from coarser grids")
+    parser.add_argument(
+        "--predict-from", type=int, default=PREDICT_FROM, help=f"largest coarse grid size (default: {PREDICT_FROM})"
+    )
+    parser.add_argument("--check", type=Path, nargs="+", default=[], help="result logs and res* files to validate")
+    parser.add_argument("--tol", type=float, default=PRINT_TOLERANCE, help="absolute tolerance for --check")
+    args = parser.parse_args(argv)
+    if args.check:
+        if args.method or args.predict or args.memmap:
+            parser.error("--check takes its configurations from the files")
+        return args
+    if args.method is None or len(args.size) not in (1, 2):
+        parser.error("give a method and X [Y]")
+    if len(args.size) == 1:
+        args.size.append(args.size[0])
+    if min(args.size) < 3:
+        parser.error("X and Y must be at least 3")
+    if args.grid and (min(args.grid) < 1 or args.memmap or args.block_rows):
+        parser.error("--grid needs positive PX, PY and runs in memory without --block-rows")
+    if args.block_rows is not None and args.block_rows < 1:
+        parser.error("--block-rows must be positive")
+    if args.predict and (args.constant or args.grid):
+        parser.error("--predict estimates the serial TEST_CONV loop")
+    return args
+
+
+def run(args, workdir):
+    X, Y = args.size
+    name = METHODS[args.method]["name"]
+    if args.predict:
+        iters, exponent, runs = predict_iterations(args.method, X, Y, args.predict_from)
+        for x, y, crossing in runs:
+            print(f"{name} X {x} Y {y} converges at t = {crossing}")
+        if iters is None:
+            print(f"Need two grids between {PREDICT_MIN} and --predict-from {args.predict_from} to extrapolate")
+            return 1
+        fit = "solved" if exponent is None else f"t ~ X^{exponent:.2f}"
+        print(f"Predicted: {name} X {X} Y {Y} Iter {iters} ({fit})")
+        return 0
+    if args.grid:
+        result = solve_mpi(args.method, X, Y, args.grid[0], args.grid[1], args.constant, args.max_iter)
+    else:
+        result = solve(args.method, X, Y, args.constant, args.max_iter, args.block_rows, workdir)
+    if not args.constant and not result["converged"]:
+        print(f"Not converged after {result['t']} iterations")
+    print(result_line(args.method, X, Y, args.grid, result))
+    if args.res:
+        path = args.res / res_name(args.method, X, Y, args.grid) if args.res.is_dir() else args.res
+        write_res(path, result["grid"])
+        print(f"Wrote {path}")
+    return 0
+
+
+def main(argv):
+    args = parse_args(argv)
+    # Odd-sized blocks make the MPI red/black SOR diverge; replay it quietly.
+    np.seterr(over="ignore", invalid="ignore")
+    if args.check:
+        return 1 if check_files(args.check, args.constant, args.max_iter, args.tol) else 0
+    if args.memmap is None:
+        return run(args, None)
+    args.memmap.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=args.memmap, prefix="heat_ref_") as workdir:
+        return run(args, workdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
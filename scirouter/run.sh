@@ -0,0 +1,3 @@
+#!/usr/bin/bash
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+python3 "$SCRIPT_DIR/transfer_manager.py" run "$@"
@@ -1,14 +1,21 @@
 import getpass
+import hashlib
 import itertools
 import os
+import posixpath
 import re
 import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
 import time
 
 import pexpect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+import profiling
+
 def load_env_file(path):
     if not os.path.exists(path):
         return
@@ -270,6 +277,7 @@ def handle_transfer_interaction(
     spinner = itertools.cycle("|/-\\")
     spinner_active = False
     last_activity = time.monotonic()
+    started = profiling.now()
     max_silence = timeout_initial
 
     def clear_spinner():
@@ -305,6 +313,7 @@ def handle_transfer_interaction(
         if index == 0: # password:
             clear_spinner()
             child.sendline(PASSWORD)
+            profiling.record("auth", started, profiling.now(), step=status_label)
             max_silence = timeout_copy
             last_activity = now
             continue
@@ -398,9 +407,69 @@ def run_transfer_with_pexpect(
         print_skipped_files(source_files, output.changed_paths)
     return True
 
-def run_step_1_pull_remote_rsync():
+# By default pull() does not copy the raw run logs: tools/results.py is
+# piped into python3 on Scirouter, writes one columnar summary per exercise
+# and lists the logs that summary covers. Only those logs are left out of
+# the sync; logs it cannot parse (heat transfer, conc_ll, Game of Life, every
+# *.err) still travel. `pull --raw` copies everything as before.
+SUMMARIZER = os.path.join(REPO_ROOT, "tools", "results.py")
+SUMMARY_NAME = "results_summary.json"
+
+def orion_summarizer_path():
+    return f"{ORION_HOME}/shared/.summarize.py"
+
+def orion_parsed_logs_path():
+    return f"{ORION_HOME}/shared/.parsed_logs"
+
+def upload_summarizer():
+    cmd = [
+        "sshpass", "-p", PASSWORD,
+        "ssh", *SSH_OPTIONS,
+        ORION,
+        f"mkdir -p {ORION_HOME}/shared && cat > {orion_summarizer_path()}"
+    ]
+    try:
+        with open(SUMMARIZER, "rb") as handle:
+            subprocess.run(cmd, check=True, timeout=120, stdin=handle)
+    except OSError as exc:
+        print(f"Cannot read the summarizer: {exc}")
+        return False
+    except subprocess.TimeoutExpired:
+        print("Uploading the summarizer timed out.")
+        return False
+    except subprocess.CalledProcessError as exc:
+        print(f"Uploading the summarizer failed with exit code {exc.returncode}.")
+        return False
+    return True
+
+def build_summarize_command():
+    """
+    Runs on Orion: summarizes every exercise on Scirouter in one ssh session
+    and writes the parsed logs, anchored at the rsync transfer root, as an
+    rsync exclude list.
+    """
+    commands = []
+    for name in EXERCISE_DIRS:
+        path = f"{SCIROUTER_SHARED}/{name}"
+        d = shlex.quote(path)
+        anchor = shlex.quote(f"/{os.path.basename(path)}/")
+        commands.append(
+            f'if [ -d {d} ]; then '
+            f'python3 "$f" {d} --summary {d}/{SUMMARY_NAME} --parsed "$l" '
+            f'&& awk -v p={anchor} \'{{ print p $0 }}\' "$l" && echo "Summarized "{d} >&2 '
+            f'|| echo "Summarizing "{d}" failed" >&2; fi'
+        )
+    remote = 'f=$(mktemp) && l=$(mktemp) && cat > "$f" && ' + "; ".join(commands) + '; rm -f "$f" "$l"'
+    parts = ["ssh", *SSH_OPTIONS, SCIROUTER, remote]
+    return (
+        f"{' '.join(shlex.quote(part) for part in parts)} < {shlex.quote(orion_summarizer_path())} "
+        f"> {shlex.quote(orion_parsed_logs_path())}"
+    )
+
+def run_step_1_pull_remote_rsync(raw=False):
     """
     On Orion: rsync --checksum scirouter:.../shared/<exercise> /home/parallel/parlab16/shared
+    Without raw, the logs are summarized on Scirouter first and left out.
     """
     print("Step 1: Orion pulling from Scirouter...")
     child = pexpect.spawn(
@@ -411,10 +480,11 @@ def run_step_1_pull_remote_rsync():
     child.logfile_read = output
 
     # Handle Orion Login
-    i = child.expect(['password:', '[$#]'], timeout=10)
-    if i == 0:
-        child.sendline(PASSWORD)
-        child.expect(['[$#]', 'parlab16@orion'], timeout=10)
+    with profiling.span("auth", step="Orion login"):
+        i = child.expect(['password:', '[$#]'], timeout=10)
+        if i == 0:
+            child.sendline(PASSWORD)
+            child.expect(['[$#]', 'parlab16@orion'], timeout=10)
 
     child.sendline(f"mkdir -p {ORION_HOME}/shared")
     child.expect(['[$#]'], timeout=10)
@@ -424,13 +494,17 @@ def run_step_1_pull_remote_rsync():
         f"{SCIROUTER}:{SCIROUTER_SHARED}/{name}"
         for name in EXERCISE_DIRS
     ]
+    excludes = [] if raw else [f"--exclude-from={orion_parsed_logs_path()}"]
     rsync_args = [
         *RSYNC_BASE_ARGS,
+        *excludes,
         "-e", ssh_cmd,
         *remote_sources,
         f"{ORION_HOME}/shared/"
     ]
     rsync_cmd = " ".join(shlex.quote(arg) for arg in rsync_args)
+    if not raw:
+        rsync_cmd = f"{build_summarize_command()}; {rsync_cmd}"
     child.sendline(f"{rsync_cmd}; printf '{RSYNC_STATUS_PREFIX}%s\\n' $?; exit")
 
     ok = handle_transfer_interaction(
@@ -473,10 +547,11 @@ def run_step_2_push_remote_rsync(source_files):
     output = RsyncOutput(format_rsync_line, status_prefix=RSYNC_STATUS_PREFIX)
     child.logfile_read = output
 
-    i = child.expect(['password:', '[$#]'], timeout=10)
-    if i == 0:
-        child.sendline(PASSWORD)
-        child.expect(['[$#]', 'parlab16@orion'], timeout=10)
+    with profiling.span("auth", step="Orion login"):
+        i = child.expect(['password:', '[$#]'], timeout=10)
+        if i == 0:
+            child.sendline(PASSWORD)
+            child.expect(['[$#]', 'parlab16@orion'], timeout=10)
 
     ssh_cmd = build_ssh_command()
     local_sources = [
@@ -517,11 +592,20 @@ def run_step_2_push_remote_rsync(source_files):
     child.close()
     return True
 
-def pull():
+def pull(raw=False):
     require_password()
     validate_transfer_paths()
+    if not raw:
+        print("Step 0: Uploading the result summarizer to Orion...")
+        with profiling.span("transfer", step="upload summarizer"):
+            ok = upload_summarizer()
+        if not ok:
+            print("Failed Step 0 (use 'pull --raw' to copy the logs instead)")
+            sys.exit(1)
     # 1. Remote rsync (Orion pulls from Scirouter)
-    if not run_step_1_pull_remote_rsync():
+    with profiling.span("transfer", step="Scirouter -> Orion"):
+        ok = run_step_1_pull_remote_rsync(raw)
+    if not ok:
         print("Failed Step 1")
         sys.exit(1)
         
@@ -539,7 +623,9 @@ def pull():
         LOCAL_PARALLEL
     ]
     rsync_cmd = " ".join(shlex.quote(arg) for arg in rsync_args)
-    if not run_transfer_with_pexpect(rsync_cmd, "Step 2", print_skips=False):
+    with profiling.span("transfer", step="Orion -> local"):
+        ok = run_transfer_with_pexpect(rsync_cmd, "Step 2", print_skips=False)
+    if not ok:
         print("Failed Step 2")
         sys.exit(1)
     
@@ -551,7 +637,9 @@ def pull():
         ORION,
         f"rm -rf {ORION_HOME}/shared"
     ]
-    if not run_cmd(cmd, "Step 3", timeout=120):
+    with profiling.span("cleanup"):
+        ok = run_cmd(cmd, "Step 3", timeout=120)
+    if not ok:
         print("Warning: cleanup did not finish.")
     print("Pull Complete.")
 
@@ -566,7 +654,9 @@ def push():
         ORION,
         f"mkdir -p {ORION_HOME}/shared"
     ]
-    if not run_cmd(cmd, "Step 1"):
+    with profiling.span("prepare"):
+        ok = run_cmd(cmd, "Step 1")
+    if not ok:
         print("Failed Step 1")
         sys.exit(1)
 
@@ -581,12 +671,16 @@ def push():
         f"{ORION}:{ORION_HOME}/shared/"
     ]
     rsync_cmd = " ".join(shlex.quote(arg) for arg in rsync_args)
-    if not run_transfer_with_pexpect(rsync_cmd, "Step 2", source_files=local_files, print_skips=False):
+    with profiling.span("transfer", step="local -> Orion"):
+        ok = run_transfer_with_pexpect(rsync_cmd, "Step 2", source_files=local_files, print_skips=False)
+    if not ok:
         print("Failed Step 2")
         sys.exit(1)
         
     # 3. Remote rsync (Orion pushes to Scirouter)
-    if not run_step_2_push_remote_rsync(local_files):
+    with profiling.span("transfer", step="Orion -> Scirouter"):
+        ok = run_step_2_push_remote_rsync(local_files)
+    if not ok:
         print("Failed Step 3")
         sys.exit(1)
         
@@ -598,19 +692,679 @@ def push():
         ORION,
         f"rm -rf {ORION_HOME}/shared"
     ]
-    if not run_cmd(cmd, "Step 4", timeout=120):
+    with profiling.span("cleanup"):
+        ok = run_cmd(cmd, "Step 4", timeout=120)
+    if not ok:
         print("Warning: cleanup did not finish.")
     print("Push Complete.")
 
+# `run` keeps one login per hop for the whole round trip: an SSH control
+# master to Orion on this machine and one to Scirouter on Orion. All later
+# rsync/ssh calls reuse them, so the password is typed (or sent) only once.
+# With RUN_LOCAL_ROOT set, the "cluster" is that local directory and the
+# commands run in a local shell, which allows testing with a fake qsub/qstat.
+RUN_LOCAL_ROOT = os.getenv("RUN_LOCAL_ROOT")
+QSUB = os.getenv("QSUB", "qsub")
+QSTAT = os.getenv("QSTAT", "qstat")
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "15"))
+OUTPUT_WAIT = 120
+BUILD_SCRIPT = "make_on_queue.sh"
+CONTROL_PERSIST = "10m"
+RUN_STATUS_PREFIX = "__RUN_STATUS__:"
+RUN_BEGIN_MARKER = "__RUN_BEGIN__"
+JOB_STATE_PREFIX = "__JOB_STATE__:"
+FINISHED_STATES = ("C", "E", "F")
+
+class StatusHolder:
+    def __init__(self):
+        self.status = None
+
+def quote_command(parts):
+    return " ".join(shlex.quote(part) for part in parts)
+
+class ClusterSession:
+    def __init__(self, exercise):
+        self.exercise = exercise
+        self.local = bool(RUN_LOCAL_ROOT)
+        self.shell = None
+        self.control_dir = None
+        self.control_path = None
+        self.remote_control_path = f"{ORION_HOME}/.transfer_manager-scirouter.sock"
+        if self.local:
+            self.cluster_dir = os.path.join(os.path.abspath(RUN_LOCAL_ROOT), exercise)
+        else:
+            self.cluster_dir = f"{SCIROUTER_SHARED}/{exercise}"
+
+    def orion_ssh(self):
+        return ["ssh", "-S", self.control_path, *SSH_OPTIONS]
+
+    def scirouter_ssh(self):
+        return ["ssh", "-S", self.remote_control_path, *SSH_OPTIONS]
+
+    def open(self):
+        if self.local:
+            self.shell = pexpect.spawn("bash", ["--norc", "--noprofile"], encoding="utf-8")
+            return self.start_shell()
+        require_password()
+        self.control_dir = tempfile.mkdtemp(prefix="transfer_manager-")
+        self.control_path = os.path.join(self.control_dir, "orion.sock")
+        print("Authenticating to Orion...")
+        master = pexpect.spawn(
+            quote_command([
+                "ssh", "-M", "-S", self.control_path, "-o", f"ControlPersist={CONTROL_PERSIST}",
+                *SSH_OPTIONS, ORION, "true",
+            ]),
+            encoding="utf-8",
+        )
+        ok = handle_transfer_interaction(master, status_label="Orion login", prompt_pattern=None)
+        master.close()
+        if not ok or master.exitstatus not in (0, None):
+            print("Could not open a session to Orion.")
+            return False
+        self.shell = pexpect.spawn(quote_command([*self.orion_ssh(), "-tt", ORION]), encoding="utf-8")
+        if not self.start_shell():
+            return False
+        print("Authenticating to Scirouter...")
+        master_cmd = quote_command([
+            "ssh", "-M", "-S", self.remote_control_path, "-o", f"ControlPersist={CONTROL_PERSIST}",
+            *SSH_OPTIONS, SCIROUTER, "true",
+        ])
+        self.shell.sendline(f"{master_cmd}; printf '{RUN_STATUS_PREFIX}%s\\n' $?")
+        holder = StatusHolder()
+        ok = handle_transfer_interaction(
+            self.shell,
+            status_label="Scirouter login",
+            prompt_pattern=None,
+            status_prefix=RUN_STATUS_PREFIX,
+            status_output=holder,
+        )
+        if not ok or holder.status != 0:
+            print("Could not open a session to Scirouter.")
+            return False
+        return True
+
+    def start_shell(self):
+        # Turn off echo so command output can be told apart from the input.
+        self.shell.sendline(f"stty -echo; printf '{RUN_BEGIN_MARKER}\\n'")
+        try:
+            self.shell.expect(RUN_BEGIN_MARKER + r"\r?\n", timeout=30)
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            print("Remote shell did not start.")
+            return False
+        return True
+
+    def run(self, command, timeout=120):
+        """Runs command in the session shell and returns (exit status, output)."""
+        self.shell.sendline(f"printf '{RUN_BEGIN_MARKER}\\n'; {command}; printf '{RUN_STATUS_PREFIX}%s\\n' $?")
+        try:
+            self.shell.expect(RUN_BEGIN_MARKER + r"\r?\n", timeout=timeout)
+            self.shell.expect(re.escape(RUN_STATUS_PREFIX) + r"(\d+)", timeout=timeout)
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            return None, self.shell.before or ""
+        return int(self.shell.match.group(1)), self.shell.before.replace("\r", "")
+
+    def cluster_command(self, command, cwd=None):
+        command = f"cd {shlex.quote(cwd or self.cluster_dir)} && {command}"
+        if self.local:
+            return command
+        return quote_command([*self.scirouter_ssh(), SCIROUTER, command])
+
+    def run_on_cluster(self, command, cwd=None, timeout=120):
+        return self.run(self.cluster_command(command, cwd), timeout=timeout)
+
+    def sync(self):
+        local_path = os.path.join(LOCAL_PARALLEL, self.exercise)
+        if self.local:
+            os.makedirs(RUN_LOCAL_ROOT, exist_ok=True)
+            return run_cmd([*RSYNC_BASE_ARGS, local_path, f"{os.path.abspath(RUN_LOCAL_ROOT)}/"], "Sync")
+        status, _ = self.run(f"mkdir -p {shlex.quote(ORION_HOME)}/shared")
+        if status != 0:
+            return False
+        rsync_args = [
+            *RSYNC_BASE_ARGS,
+            "-e", quote_command(self.orion_ssh()),
+            local_path,
+            f"{ORION}:{ORION_HOME}/shared/",
+        ]
+        if not run_cmd(rsync_args, "Sync to Orion"):
+            return False
+        rsync_args = [
+            *RSYNC_BASE_ARGS,
+            "-e", quote_command(self.scirouter_ssh()),
+            f"{ORION_HOME}/shared/{self.exercise}",
+            f"{SCIROUTER}:{SCIROUTER_SHARED}/",
+        ]
+        status, output = self.run(quote_command(rsync_args), timeout=1200)
+        print(output, end="")
+        if status != 0:
+            print(f"Sync to Scirouter failed with exit code {status}.")
+            return False
+        return True
+
+    def fetch(self, rel_paths):
+        """Copies files (relative to the exercise directory) from the cluster."""
+        local_path = os.path.join(LOCAL_PARALLEL, self.exercise)
+        anchored = [f"/./{path}" for path in rel_paths]
+        if self.local:
+            sources = [self.cluster_dir + path for path in anchored]
+            return run_cmd([*RSYNC_BASE_ARGS, "--relative", *sources, f"{local_path}/"], "Fetch")
+        orion_dir = f"{ORION_HOME}/shared/{self.exercise}"
+        rsync_args = [
+            *RSYNC_BASE_ARGS,
+            "--relative",
+            "-e", quote_command(self.scirouter_ssh()),
+            *[f"{SCIROUTER}:{self.cluster_dir}{path}" for path in anchored],
+            f"{orion_dir}/",
+        ]
+        status, output = self.run(f"mkdir -p {shlex.quote(orion_dir)} && {quote_command(rsync_args)}", timeout=600)
+        if status != 0:
+            print(output, end="")
+            print(f"Fetching from Scirouter failed with exit code {status}.")
+            return False
+        rsync_args = [
+            *RSYNC_BASE_ARGS,
+            "--relative",
+            "-e", quote_command(self.orion_ssh()),
+            *[f"{ORION}:{orion_dir}{path}" for path in anchored],
+            f"{local_path}/",
+        ]
+        return run_cmd(rsync_args, "Fetch from Orion")
+
+    def close(self):
+        if self.shell is not None and self.shell.isalive():
+            if not self.local:
+                self.run(f"rm -rf {shlex.quote(ORION_HOME)}/shared")
+                self.run(quote_command([*self.scirouter_ssh(), "-O", "exit", SCIROUTER]) + " 2>/dev/null")
+            self.shell.sendline("exit")
+            self.shell.close()
+        if self.control_path:
+            subprocess.run([*self.orion_ssh(), "-O", "exit", ORION], stderr=subprocess.DEVNULL)
+        if self.control_dir:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
+
+def read_script_directives(text):
+    directives = {}
+    for line in text.splitlines():
+        match = re.match(r"#PBS\s+-([NoeW])\s+(\S+)", line.strip())
+        if match:
+            directives.setdefault(match.group(1), match.group(2))
+    return directives
+
+def job_output_paths(session, script_dir, script_path, job_id):
+    """The -o/-e files of a job, relative to the exercise directory."""
+    with open(script_path, "r", encoding="utf-8") as handle:
+        directives = read_script_directives(handle.read())
+    name = directives.get("N", os.path.basename(script_path))
+    sequence = job_id.split(".", 1)[0]
+    submit_dir = os.path.join(session.cluster_dir, script_dir)
+    paths = []
+    for flag in ("o", "e"):
+        path = directives.get(flag, f"{name}.{flag}{sequence}")
+        if ":" in path:
+            path = path.split(":", 1)[1]
+        if not os.path.isabs(path):
+            path = os.path.join(submit_dir, path)
+        path = os.path.normpath(path)
+        if not path_within(session.cluster_dir, path):
+            print(f"Warning: {path} is outside {session.cluster_dir}; not fetching it.")
+            continue
+        paths.append(os.path.relpath(path, session.cluster_dir))
+    return paths
+
+def submit_job(session, script_dir, script_name, qsub_args, depends_on=None):
+    args = [QSUB, *qsub_args]
+    if depends_on:
+        args += ["-W", f"depend=afterok:{depends_on}"]
+    args.append(script_name)
+    status, output = session.run_on_cluster(quote_command(args), cwd=os.path.join(session.cluster_dir, script_dir))
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if status != 0 or not lines:
+        print(output, end="")
+        print(f"qsub {script_name} failed.")
+        return None
+    job_id = lines[-1]
+    print(f"Submitted {script_name} as job {job_id}.")
+    return job_id
+
+def poll_command(job_ids):
+    # Runs on the cluster: one qstat per job every POLL_INTERVAL seconds,
+    # reporting "id=state" pairs until any of the jobs is gone or complete.
+    qstat = shlex.quote(QSTAT)
+    ids = " ".join(shlex.quote(job_id) for job_id in job_ids)
+    return (
+        f"while :; do line=''; for id in {ids}; do "
+        f"s=$({qstat} \"$id\" 2>/dev/null | awk 'NR > 2 {{ print $5; exit }}'); "
+        f"line=\"$line $id=${{s:-C}}\"; done; "
+        f"printf '{JOB_STATE_PREFIX}%s\\n' \"$line\"; "
+        f"case \"$line\" in *=[{''.join(FINISHED_STATES)}]\\ *|*=[{''.join(FINISHED_STATES)}]) break;; esac; "
+        f"sleep {POLL_INTERVAL}; done"
+    )
+
+def wait_for_jobs(session, job_ids, states):
+    """Polls until at least one job finishes; returns the finished job ids."""
+    session.shell.sendline(
+        f"printf '{RUN_BEGIN_MARKER}\\n'; {session.cluster_command(poll_command(job_ids))}; "
+        f"printf '{RUN_STATUS_PREFIX}%s\\n' $?"
+    )
+    patterns = [re.escape(JOB_STATE_PREFIX) + r"([^\r\n]*)\r?\n", re.escape(RUN_STATUS_PREFIX) + r"(\d+)"]
+    finished = []
+    session.shell.expect(RUN_BEGIN_MARKER + r"\r?\n", timeout=120)
+    while True:
+        try:
+            index = session.shell.expect(patterns, timeout=max(120, POLL_INTERVAL * 6))
+        except (pexpect.TIMEOUT, pexpect.EOF):
+            print("Lost contact with the queue poller.")
+            return None
+        if index == 1:
+            if session.shell.match.group(1) != "0":
+                print("Polling the queue failed.")
+                return None
+            return finished
+        for pair in session.shell.match.group(1).split():
+            job_id, state = pair.rsplit("=", 1)
+            if states.get(job_id) != state:
+                print(f"[{time.strftime('%H:%M:%S')}] job {job_id}: {state}")
+                states[job_id] = state
+            if state in FINISHED_STATES and job_id not in finished:
+                finished.append(job_id)
+
+def create_submit_stamp(session):
+    # PBS appends to the same -o/-e files on every submission, so only files
+    # newer than this stamp belong to the jobs about to be submitted. It lives
+    # next to the exercise (same file system as the outputs), so pull never
+    # brings it back.
+    parent = shlex.quote(os.path.dirname(session.cluster_dir))
+    status, output = session.run_on_cluster(f"mktemp -p {parent} .submit_stamp.XXXXXX")
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if status != 0 or not lines:
+        print(output, end="")
+        print("Could not create the submission stamp.")
+        return None
+    return lines[-1]
+
+def wait_for_outputs(session, rel_paths, stamp):
+    # PBS copies -o/-e back a little after the job has left the queue; files
+    # older than the submission are left over from an earlier run.
+    stamp = shlex.quote(stamp)
+    tests = " && ".join(f"[ {shlex.quote(path)} -nt {stamp} ]" for path in rel_paths)
+    session.run_on_cluster(
+        f"t=0; until {tests} || [ $t -ge {OUTPUT_WAIT} ]; do sleep 2; t=$((t + 2)); done",
+        timeout=OUTPUT_WAIT + 60,
+    )
+    status, output = session.run_on_cluster(
+        "for f in " + " ".join(shlex.quote(path) for path in rel_paths) + f"; do [ \"$f\" -nt {stamp} ] && echo \"$f\"; done; true"
+    )
+    return [line.strip() for line in output.splitlines() if line.strip()]
+
+# Build cache: every binary target of the Makefile next to make_on_queue.sh
+# gets a key hashed from the sources it is built from, the Makefile
+# variables and recipes on its dependency chain (i.e. the compiler flags),
+# all headers and the build script. Binaries are kept on the cluster in
+# <shared>/.build_cache/<exercise>/<target>/<key>/, so a build is only
+# submitted for targets whose key is not cached yet.
+BUILD_CACHE = os.getenv("BUILD_CACHE", "1") != "0"
+BUILD_CACHE_DIR = ".build_cache"
+CACHED_BUILD_SCRIPT = ".make_cached.XXXXXX"
+HEADER_SUFFIXES = (".h", ".cuh")
+NON_BINARY_TARGETS = ("all", "clean")
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_makefile(path):
+    with open(path, "r", encoding="utf-8") as handle:
+        text = handle.read().replace("\\\n", " ")
+    variables = {}
+    rules = {}
+    current = None
+    for raw in text.splitlines():
+        if raw.startswith("\t"):
+            if current is not None:
+                current["recipe"].append(raw.strip())
+            continue
+        line = raw.split("#", 1)[0].rstrip()
+        if not line.strip():
+            continue
+        match = re.match(r"^\s*([A-Za-z_][A-Za-z0-9_]*)\s*(\+=|:=|\?=|=)\s*(.*)$", line)
+        if match:
+            name, op, value = match.groups()
+            if op == "+=" and name in variables:
+                value = f"{variables[name]} {value}"
+            variables[name] = value.strip()
+            current = None
+            continue
+        if ":" in line:
+            targets, prereqs = line.split(":", 1)
+            current = {"prereqs": prereqs.split(), "recipe": []}
+            for target in targets.split():
+                rules.setdefault(target, current)
+    return variables, rules
+
+def expand(text, variables, depth=0):
+    if depth > 10:
+        return text
+    expanded = re.sub(
+        r"\$[({]([A-Za-z_][A-Za-z0-9_]*)[)}]",
+        lambda m: variables.get(m.group(1), ""),
+        text,
+    )
+    if expanded == text:
+        return expanded
+    return expand(expanded, variables, depth + 1)
+
+def find_rule(target, variables, rules):
+    for name, rule in rules.items():
+        if expand(name, variables) == target:
+            return rule, None
+    for name, rule in rules.items():
+        pattern = expand(name, variables)
+        if "%" not in pattern:
+            continue
+        prefix, suffix = pattern.split("%", 1)
+        if target.startswith(prefix) and target.endswith(suffix) and len(target) >= len(prefix) + len(suffix):
+            return rule, target[len(prefix):len(target) - len(suffix)]
+    return None, None
+
+def collect_build_inputs(make_dir, target, variables, rules, inputs, recipes, seen):
+    if target in seen:
+        return
+    seen.add(target)
+    rule, stem = find_rule(target, variables, rules)
+    if rule is None:
+        if os.path.isfile(os.path.join(make_dir, target)):
+            inputs.add(target)
+        return
+    for line in rule["recipe"]:
+        recipes.append(f"{target}: {expand(line, variables)}")
+    for prereq in expand(" ".join(rule["prereqs"]), variables).split():
+        if stem is not None:
+            prereq = prereq.replace("%", stem)
+        collect_build_inputs(make_dir, prereq, variables, rules, inputs, recipes, seen)
+
+def binary_name(target, rule, variables):
+    for line in rule["recipe"]:
+        match = re.search(r"-o\s+(\S+)", expand(line, variables))
+        if match:
+            return target if match.group(1) == "$@" else match.group(1)
+    return target
+
+def script_targets(script_text, variables, rules):
+    """Binary targets a make_on_queue.sh builds: the ones it names, else 'all'."""
+    binaries = [
+        name for name, rule in rules.items()
+        if rule["recipe"] and name not in NON_BINARY_TARGETS
+        and not name.startswith(".") and "%" not in name and "$" not in name and not name.endswith(".o")
+    ]
+    words = set(re.findall(r"[A-Za-z0-9_.\-]+", script_text))
+    named = [name for name in binaries if name in words]
+    if named:
+        return named
+    rule, _ = find_rule("all", variables, rules)
+    if rule is not None:
+        return [t for t in expand(" ".join(rule["prereqs"]), variables).split() if t in binaries]
+    return binaries[:1]
+
+def build_keys(make_dir, build_script):
+    """Returns {target: {"key": ..., "binary": ...}} for the targets build_script makes."""
+    makefile = os.path.join(make_dir, "Makefile")
+    if not os.path.isfile(makefile):
+        return {}
+    variables, rules = read_makefile(makefile)
+    with open(build_script, "r", encoding="utf-8") as handle:
+        script_text = handle.read()
+    headers = set()
+    for root, _, filenames in os.walk(make_dir):
+        for name in filenames:
+            if name.endswith(HEADER_SUFFIXES):
+                headers.add(os.path.relpath(os.path.join(root, name), make_dir))
+    hashes = {}
+    keys = {}
+    for target in script_targets(script_text, variables, rules):
+        inputs, recipes = set(headers), []
+        collect_build_inputs(make_dir, target, variables, rules, inputs, recipes, set())
+        digest = hashlib.sha256()
+        digest.update(f"target {target}\n".encode())
+        digest.update(f"script {file_hash(build_script)}\n".encode())
+        for path in sorted(inputs):
+            if path not in hashes:
+                hashes[path] = file_hash(os.path.join(make_dir, path))
+            digest.update(f"file {path} {hashes[path]}\n".encode())
+        for line in recipes:
+            digest.update(f"recipe {line}\n".encode())
+        keys[target] = {
+            "key": digest.hexdigest()[:16],
+            "binary": binary_name(target, find_rule(target, variables, rules)[0], variables),
+        }
+    return keys
+
+def cache_root(session):
+    base = os.path.abspath(RUN_LOCAL_ROOT) if session.local else SCIROUTER_SHARED
+    return f"{base}/{BUILD_CACHE_DIR}"
+
+def cache_entry(session, cache_name, target, info):
+    return f"{cache_root(session)}/{cache_name}/{target}/{info['key']}/{os.path.basename(info['binary'])}"
+
+def restore_cached_builds(session, make_dir, cache_name, keys):
+    """Copies cached binaries into place; returns the targets that still need a build."""
+    commands = []
+    for target, info in keys.items():
+        entry = shlex.quote(cache_entry(session, cache_name, target, info))
+        binary = shlex.quote(info["binary"])
+        commands.append(
+            f"if [ -f {entry} ]; then cp -p {entry} {binary} && echo HIT:{target}; else echo MISS:{target}; fi"
+        )
+    status, output = session.run_on_cluster("; ".join(commands), cwd=make_dir)
+    if status != 0:
+        return list(keys)
+    hits = set(re.findall(r"^HIT:(\S+)", output, re.MULTILINE))
+    for target in keys:
+        if target in hits:
+            print(f"Build cache hit: {target} ({keys[target]['key']})")
+    return [target for target in keys if target not in hits]
+
+def store_cached_builds(session, make_dir, cache_name, keys, targets, stamp):
+    # Only binaries written after the build was submitted are stored, so a
+    # failed build never leaves a stale binary under a new key.
+    commands = []
+    for target in targets:
+        info = keys[target]
+        entry = cache_entry(session, cache_name, target, info)
+        binary = shlex.quote(info["binary"])
+        commands.append(
+            f"if [ {binary} -nt {shlex.quote(stamp)} ]; then mkdir -p {shlex.quote(os.path.dirname(entry))} "
+            f"&& cp -p {binary} {shlex.quote(entry)} && echo STORED:{target}; else echo FAILED:{target}; fi"
+        )
+    status, output = session.run_on_cluster("; ".join(commands), cwd=make_dir)
+    for target in re.findall(r"^STORED:(\S+)", output, re.MULTILINE):
+        print(f"Build cached: {target} ({keys[target]['key']})")
+    for target in re.findall(r"^FAILED:(\S+)", output, re.MULTILINE):
+        print(f"Warning: {target} was not rebuilt; check the build output.")
+
+# Sourced make_on_queue.sh keeps its environment setup (module load, cd,
+# logging); only its make calls are narrowed down to the uncached targets.
+# "clean" would delete the restored binaries, and a call without targets
+# (or with a non-binary one such as "all") builds all of the missing ones.
+PARTIAL_BUILD_MAKE = """make() {
+	targets=
+	options=
+	named=
+	for arg in "$@"; do
+		case "$arg" in
+			clean) return 0 ;;
+			-*|*=*) options="$options $arg"; continue ;;
+		esac
+		named=1
+		case " $cached " in *" $arg "*) continue ;; esac
+		case " $rebuild " in
+			*" $arg "*) targets="$targets $arg" ;;
+			*) targets="$targets $rebuild" ;;
+		esac
+	done
+	if [ -z "$named" ]; then
+		targets=$rebuild
+	fi
+	if [ -z "$targets" ]; then
+		return 0
+	fi
+	command make -B $options $targets
+}
+"""
+
+def write_partial_build_script(session, make_dir, build_script, targets, cached):
+    """
+    Writes a job script that rebuilds only targets, next to the exercise
+    directory so pull never brings it back. Returns its path on the cluster.
+    """
+    # The #PBS header (name, -o/-e, resources) has to be in the submitted script.
+    with open(build_script, "r", encoding="utf-8") as handle:
+        header = [line.rstrip("\n") for line in handle if line.startswith("#")]
+    source = posixpath.join(make_dir, os.path.basename(build_script))
+    body = header + [
+        "",
+        f"rebuild={shlex.quote(' '.join(targets))}",
+        f"cached={shlex.quote(' '.join(cached))}",
+        PARTIAL_BUILD_MAKE,
+        'cd "${PBS_O_WORKDIR:-.}"',
+        f". {shlex.quote(source)}",
+        "",
+    ]
+    content = "\n".join(body).replace("\\", "\\\\").replace("\n", "\\n")
+    parent = shlex.quote(os.path.dirname(session.cluster_dir))
+    status, output = session.run_on_cluster(
+        f"f=$(mktemp -p {parent} {CACHED_BUILD_SCRIPT}) && printf '%b' {shlex.quote(content)} > \"$f\" && echo \"$f\""
+    )
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    if status != 0 or not lines:
+        print(output, end="")
+        print("Could not write the partial build script; building every target.")
+        return None
+    return lines[-1]
+
+def run(exercise, script, qsub_args):
+    validate_transfer_paths()
+    if exercise not in EXERCISE_DIRS:
+        die(f"{exercise} is not listed in EXERCISE_DIRS.")
+    exercise_path = os.path.join(LOCAL_PARALLEL, exercise)
+    script_path = os.path.normpath(os.path.join(exercise_path, script))
+    if not path_within(exercise_path, script_path) or not os.path.isfile(script_path):
+        die(f"Job script not found in {exercise}: {script}")
+    script_dir, script_name = os.path.split(os.path.relpath(script_path, exercise_path))
+    build_path = os.path.join(exercise_path, script_dir, BUILD_SCRIPT)
+    has_build = script_name != BUILD_SCRIPT and os.path.isfile(build_path)
+    keys = {}
+    if has_build and BUILD_CACHE:
+        keys = build_keys(os.path.dirname(build_path), build_path)
+
+    session = ClusterSession(exercise)
+    stamp = None
+    partial_build = None
+    try:
+        with profiling.span("auth", step="session"):
+            ok = session.open()
+        if not ok:
+            sys.exit(1)
+        print(f"Step 1: Syncing {exercise}...")
+        with profiling.span("transfer", step="sync"):
+            ok = session.sync()
+        if not ok:
+            print("Failed Step 1")
+            sys.exit(1)
+
+        print("Step 2: Submitting jobs...")
+        stamp = create_submit_stamp(session)
+        if stamp is None:
+            print("Failed Step 2")
+            sys.exit(1)
+        make_dir = os.path.join(session.cluster_dir, script_dir)
+        cache_name = os.path.normpath(os.path.join(exercise, script_dir))
+        jobs = {}
+        depends_on = None
+        build_job = None
+        rebuild = list(keys)
+        if has_build:
+            build_name = BUILD_SCRIPT
+            if keys:
+                with profiling.span("cache"):
+                    rebuild = restore_cached_builds(session, make_dir, cache_name, keys)
+                if rebuild and len(rebuild) < len(keys):
+                    cached = [target for target in keys if target not in rebuild]
+                    partial_build = write_partial_build_script(session, make_dir, build_path, rebuild, cached)
+                    if partial_build:
+                        build_name = partial_build
+            if keys and not rebuild:
+                print(f"All {len(keys)} targets are cached; skipping {BUILD_SCRIPT}.")
+            else:
+                with profiling.span("submit", script=build_name):
+                    build_job = submit_job(session, script_dir, build_name, qsub_args)
+                if build_job is None:
+                    print("Failed Step 2")
+                    sys.exit(1)
+                jobs[build_job] = job_output_paths(session, script_dir, build_path, build_job)
+                depends_on = build_job
+        with profiling.span("submit", script=script_name):
+            job_id = submit_job(session, script_dir, script_name, qsub_args, depends_on)
+        if job_id is None:
+            print("Failed Step 2")
+            sys.exit(1)
+        jobs[job_id] = job_output_paths(session, script_dir, script_path, job_id)
+
+        print("Step 3: Waiting for the jobs...")
+        states = {}
+        pending = list(jobs)
+        while pending:
+            with profiling.span("poll"):
+                finished = wait_for_jobs(session, pending, states)
+            if finished is None:
+                print("Failed Step 3")
+                sys.exit(1)
+            for job_id in finished:
+                pending.remove(job_id)
+                if job_id == build_job and keys:
+                    with profiling.span("cache", job=job_id):
+                        store_cached_builds(session, make_dir, cache_name, keys, rebuild, stamp)
+                with profiling.span("poll", job=job_id):
+                    outputs = wait_for_outputs(session, jobs[job_id], stamp)
+                if not outputs:
+                    print(f"Job {job_id} left no output files.")
+                    continue
+                print(f"Fetching output of job {job_id}: {', '.join(outputs)}")
+                with profiling.span("transfer", step="fetch", job=job_id):
+                    ok = session.fetch(outputs)
+                if not ok:
+                    print(f"Warning: could not fetch the output of job {job_id}.")
+    finally:
+        with profiling.span("cleanup"):
+            leftovers = [path for path in (stamp, partial_build) if path]
+            if leftovers:
+                session.run_on_cluster("rm -f " + quote_command(leftovers))
+            session.close()
+    print("Run Complete.")
+
 if __name__ == "__main__":
+    # --profile[=TRACE], --cprofile and --tracemalloc work with every command (see tools/profiling.py).
+    sys.argv[1:] = profiling.configure(sys.argv[1:], tool="transfer_manager")
     if len(sys.argv) < 2:
-        print("Usage: python3 transfer_manager.py [pull|push]")
+        print("Usage: python3 transfer_manager.py [--profile[=TRACE]] [pull [--raw]|push|run <exercise> <script> [qsub args...]]")
         sys.exit(1)
     
     action = sys.argv[1]
     if action == "pull":
-        pull()
+        unknown = [arg for arg in sys.argv[2:] if arg != "--raw"]
+        if unknown:
+            print(f"Unknown pull argument(s): {' '.join(unknown)}")
+            print("Usage: python3 transfer_manager.py pull [--raw]")
+            sys.exit(1)
+        pull(raw="--raw" in sys.argv[2:])
     elif action == "push":
         push()
+    elif action == "run":
+        if len(sys.argv) < 4:
+            print("Usage: python3 transfer_manager.py run <exercise> <script> [qsub args...]")
+            sys.exit(1)
+        run(sys.argv[2], sys.argv[3], sys.argv[4:])
     else:
         print("Unknown command")
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import sys
+
+from results import (
+    format_config,
+    load_results,
+    open_snapshot,
+    primary_metric,
+    sort_config_key,
+    summarize,
+)
+
+
+# The a3 DISPLAY_BLOCKS grid, and tile sizes fw_sr can recurse down to. Only
+# powers of two: the shared-memory tree reductions of the all_gpu versions
+# halve blockDim.x and drop partial sums for any other block size.
+GPU_BLOCKS = [32, 64, 128, 256, 512, 1024]
+FW_BLOCKS = [16, 32, 64, 128, 256]
+
+DEFAULT_ETA = 2
+DEFAULT_MIN_REPS = 1
+DEFAULT_BUDGET = 4
+
+
+def default_candidates(config):
+    if str(config.get("version", "")).startswith("FW"):
+        return FW_BLOCKS
+    return GPU_BLOCKS
+
+
+def group_key(config):
+    # Everything but the tuned parameter: (version, coords) for the GPU
+    # sweeps, (version, N, threads) for FW.
+    return tuple(
+        (field, config.get(field))
+        for field in ("version", "size", "coords", "clusters", "threads")
+    )
+
+
+def collect_groups(store, metric=None):
+    groups = {}
+    for key in sorted(store, key=sort_config_key):
+        entry = store[key]
+        block = entry["config"].get("block_size")
+        if block is None:
+            continue
+        name = metric or primary_metric(entry)
+        stats = summarize(entry["samples"].get(name, [])) if name else None
+        if stats is None:
+            continue
+        group = groups.setdefault(group_key(entry["config"]), {
+            "config": dict(entry["config"], block_size=None),
+            "metric": name,
+            "points": {},
+            "nloops": {},
+            "rejected": {},
+        })
+        group["points"][block] = stats
+        group["nloops"][block] = sorted(set(entry.get("nloops", [])))
+    for group in groups.values():
+        reject_wrong_loops(group)
+    return groups
+
+
+def is_power_of_two(value):
+    return value > 0 and value & (value - 1) == 0
+
+
+def reference_loops(loops):
+    """
+    The loop count the group's runs should agree on: the most common one
+    among power-of-two blocks (whose reductions are exact), else among all.
+    """
+    counts = {}
+    for block, values in loops.items():
+        for value in values:
+            counts.setdefault(value, [0, 0])
+            counts[value][0] += is_power_of_two(block)
+            counts[value][1] += 1
+    if not counts:
+        return None
+    return max(counts, key=lambda value: (counts[value], -value))
+
+
+def reject_wrong_loops(group):
+    # A block size that changes the number of k-means iterations computes a
+    # different result (e.g. a reduction that loses partial sums makes delta
+    # too small and stops early), so its time is not comparable.
+    reference = reference_loops(group["nloops"])
+    if reference is None:
+        return
+    for block, values in group["nloops"].items():
+        if values and values != [reference]:
+            group["rejected"][block] = values
+            del group["points"][block]
+    group["reference_loops"] = reference
+
+
+def solve(matrix, vector):
+    # Gaussian elimination with partial pivoting; returns None if singular.
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < 1e-12:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            for c in range(col, n + 1):
+                rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        acc = rows[r][n] - sum(rows[r][c] * solution[c] for c in range(r + 1, n))
+        solution[r] = acc / rows[r][r]
+    return solution
+
+
+def fit_surface(points):
+    """
+    Least-squares fit of log(time) = a + b*x + c*x^2 with x = log2(block),
+    weighted by the number of repetitions behind each median.
+    """
+    if len(points) < 3:
+        return None
+    xtx = [[0.0] * 3 for _ in range(3)]
+    xty = [0.0] * 3
+    for block, stats in points.items():
+        if stats["median"] <= 0.0:
+            continue
+        x = math.log2(block)
+        basis = (1.0, x, x * x)
+        weight = stats["n"]
+        y = math.log(stats["median"])
+        for i in range(3):
+            xty[i] += weight * basis[i] * y
+            for j in range(3):
+                xtx[i][j] += weight * basis[i] * basis[j]
+    return solve(xtx, xty)
+
+
+def predict(coeffs, block):
+    x = math.log2(block)
+    return math.exp(coeffs[0] + coeffs[1] * x + coeffs[2] * x * x)
+
+
+def successive_halving(points, eta, min_reps):
+    """
+    Return {block: target repetitions} still missing from the current rung.
+    Each rung keeps the best 1/eta of the previous one and gives the
+    survivors eta times the repetitions, until a single block is left.
+    """
+    rung_reps = min_reps
+    alive = sorted(points, key=lambda b: points[b]["median"])
+    while alive:
+        missing = {b: rung_reps for b in alive if points[b]["n"] < rung_reps}
+        if missing or len(alive) == 1:
+            return missing
+        alive = alive[:math.ceil(len(alive) / eta)]
+        rung_reps *= eta
+    return {}
+
+
+def tune_group(group, candidates, eta, min_reps, budget):
+    points = group["points"]
+    best_block = min(points, key=lambda b: points[b]["median"])
+    coeffs = fit_surface(points)
+    model_block = None
+    if coeffs is not None:
+        model_block = min(candidates, key=lambda b: predict(coeffs, b))
+    proposals = {}
+    # Unmeasured candidates first: the model's optimum, then the neighbours
+    # of the best measured block, which bracket the optimum on the grid.
+    unmeasured = []
+    if model_block is not None and model_block not in points:
+        unmeasured.append(model_block)
+    if best_block in candidates:
+        idx = candidates.index(best_block)
+        for neighbour in candidates[max(0, idx - 1):idx + 2]:
+            if neighbour not in points and neighbour not in unmeasured:
+                unmeasured.append(neighbour)
+    for block in unmeasured:
+        proposals[block] = min_reps
+    for block, reps in sorted(
+        successive_halving(points, eta, min_reps).items(), key=lambda item: points[item[0]]["median"]
+    ):
+        proposals.setdefault(block, reps)
+    proposals = dict(list(proposals.items())[:budget])
+    return {
+        "config": group["config"],
+        "metric": group["metric"],
+        "best_block": best_block,
+        "best_time": points[best_block]["median"],
+        "model_block": model_block,
+        "model_time": predict(coeffs, model_block) if model_block is not None else None,
+        "measured": len(points),
+        "next": [
+            dict(group["config"], block_size=block, repetitions=reps)
+            for block, reps in proposals.items()
+        ],
+    }
+
+
+def print_rejected(group):
+    for block, loops in sorted(group["rejected"].items()):
+        print(
+            f"  rejected: block {block} (nloops {', '.join(map(str, loops))}, "
+            f"expected {group['reference_loops']})"
+        )
+
+
+def parse_blocks(text):
+    return sorted({int(part) for part in text.split(",") if part.strip()})
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Recommend block/tile sizes from collected results and propose the next runs."
+    )
+    parser.add_argument("snapshot", help="results directory or git REV[:PATH]")
+    parser.add_argument("--metric", help="metric to minimize (default: loop, else total)")
+    parser.add_argument("--candidates", type=parse_blocks, help="comma-separated block sizes to search")
+    parser.add_argument(
+        "--eta", type=int, default=DEFAULT_ETA, help="successive-halving reduction factor (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--min-reps",
+        type=int,
+        default=DEFAULT_MIN_REPS,
+        help="repetitions per block in the first rung (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--budget", type=int, default=DEFAULT_BUDGET, help="max proposed runs per group (default: %(default)s)"
+    )
+    parser.add_argument("--json", metavar="FILE", help="write the proposed runs to FILE as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.eta < 2:
+        print("--eta must be at least 2")
+        return 2
+    try:
+        with open_snapshot(args.snapshot) as root:
+            store = load_results(root)
+    except ValueError as exc:
+        print(exc)
+        return 2
+    groups = collect_groups(store, args.metric)
+    if not groups:
+        print("No block-size sweeps found.")
+        return 1
+    proposals = []
+    for group in groups.values():
+        candidates = [
+            block for block in args.candidates or default_candidates(group["config"]) if block not in group["rejected"]
+        ]
+        print(format_config(group["config"]))
+        print_rejected(group)
+        if not group["points"]:
+            print("  no block left to compare")
+            continue
+        result = tune_group(group, candidates, args.eta, args.min_reps, args.budget)
+        print(
+            f"  best measured: block {result['best_block']} "
+            f"({result['best_time']:.3f} ms {result['metric']}, {result['measured']} blocks measured)"
+        )
+        if result["model_block"] is not None:
+            print(f"  model optimum: block {result['model_block']} (predicted {result['model_time']:.3f} ms)")
+        for config in result["next"]:
+            have = group["points"].get(config["block_size"], {}).get("n", 0)
+            print(f"  next: block {config['block_size']} ({have} -> {config['repetitions']} runs)")
+        proposals.extend(result["next"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(proposals, handle, indent=2)
+    print(f"\n{len(proposals)} runs proposed across {len(groups)} groups.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import argparse
+import math
+import sys
+
+from results import (
+    format_config,
+    load_results,
+    open_snapshot,
+    primary_metric,
+    sort_config_key,
+    summarize,
+)
+
+
+DEFAULT_THRESHOLD = 0.05
+DEFAULT_ALPHA = 0.05
+
+
+def nonzero(value):
+    return value if abs(value) > 1e-30 else 1e-30
+
+
+def betacf(a, b, x):
+    # Continued fraction for the regularized incomplete beta (Numerical Recipes).
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / nonzero(d)
+    h = d
+    for m in range(1, 201):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / nonzero(d)
+        c = nonzero(1.0 + aa / c)
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / nonzero(d)
+        c = nonzero(1.0 + aa / c)
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-12:
+            break
+    return h
+
+
+def betainc(a, b, x):
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x)
+    )
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * betacf(a, b, x) / a
+    return 1.0 - front * betacf(b, a, 1.0 - x) / b
+
+
+def welch_p_value(old, new):
+    """Two-sided p-value of Welch's t-test, or None with fewer than two samples."""
+    if old["n"] < 2 or new["n"] < 2:
+        return None
+    var_old = old["stdev"] ** 2 / old["n"]
+    var_new = new["stdev"] ** 2 / new["n"]
+    se = math.sqrt(var_old + var_new)
+    if se == 0.0:
+        return 0.0 if old["mean"] != new["mean"] else 1.0
+    t = (new["mean"] - old["mean"]) / se
+    dof = (var_old + var_new) ** 2 / (
+        var_old ** 2 / (old["n"] - 1) + var_new ** 2 / (new["n"] - 1)
+    )
+    return betainc(dof / 2.0, 0.5, dof / (dof + t * t))
+
+
+def run_spread(entry):
+    # Single runs still report their fastest/slowest iteration, which is the
+    # only noise estimate available without repetitions.
+    mins = entry["samples"].get("loop_min")
+    maxs = entry["samples"].get("loop_max")
+    loops = entry["samples"].get("loop")
+    if not mins or not maxs or not loops:
+        return 0.0
+    median = summarize(loops)["median"]
+    if median <= 0.0:
+        return 0.0
+    return (max(maxs) - min(mins)) / (2.0 * median)
+
+
+def compare_entry(old_entry, new_entry, metric, threshold, alpha):
+    old = summarize(old_entry["samples"].get(metric, []))
+    new = summarize(new_entry["samples"].get(metric, []))
+    if old is None or new is None or old["median"] <= 0.0:
+        return None
+    change = (new["median"] - old["median"]) / old["median"]
+    p_value = welch_p_value(old, new)
+    if p_value is None:
+        noise = max(run_spread(old_entry), run_spread(new_entry)) if metric == "loop" else 0.0
+        significant = abs(change) >= max(threshold, noise)
+    else:
+        significant = p_value < alpha and abs(change) >= threshold
+    if not significant:
+        status = "unchanged"
+    elif change > 0.0:
+        status = "slowdown"
+    else:
+        status = "speedup"
+    return {
+        "config": new_entry["config"],
+        "metric": metric,
+        "old": old,
+        "new": new,
+        "change": change,
+        "p_value": p_value,
+        "status": status,
+    }
+
+
+def compare_stores(old_store, new_store, metric=None, threshold=DEFAULT_THRESHOLD, alpha=DEFAULT_ALPHA):
+    rows = []
+    for key in sorted(set(old_store) & set(new_store), key=sort_config_key):
+        old_entry, new_entry = old_store[key], new_store[key]
+        name = metric or primary_metric(new_entry)
+        if name is None:
+            continue
+        row = compare_entry(old_entry, new_entry, name, threshold, alpha)
+        if row is not None:
+            rows.append(row)
+    only_old = [old_store[k]["config"] for k in sorted(set(old_store) - set(new_store), key=sort_config_key)]
+    only_new = [new_store[k]["config"] for k in sorted(set(new_store) - set(old_store), key=sort_config_key)]
+    return rows, only_old, only_new
+
+
+def format_row(row):
+    p_value = "-" if row["p_value"] is None else f"{row['p_value']:.3f}"
+    return (
+        f"{row['status']:<9} {row['change'] * 100.0:+7.1f}%  "
+        f"{row['old']['median']:10.3f} -> {row['new']['median']:10.3f} ms "
+        f"(n={row['old']['n']}/{row['new']['n']}, p={p_value})  "
+        f"{format_config(row['config'])} [{row['metric']}]"
+    )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Compare two result snapshots (directories or git REV[:PATH])."
+    )
+    parser.add_argument("old", help="baseline snapshot")
+    parser.add_argument("new", help="candidate snapshot")
+    parser.add_argument("--metric", help="metric to compare (default: loop, else total)")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="minimum relative change to report (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=DEFAULT_ALPHA,
+        help="significance level for Welch's t-test (default: %(default)s)",
+    )
+    parser.add_argument("--all", action="store_true", help="also list unchanged configurations")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    try:
+        with open_snapshot(args.old) as old_root:
+            old_store = load_results(old_root)
+        with open_snapshot(args.new) as new_root:
+            new_store = load_results(new_root)
+    except ValueError as exc:
+        print(exc)
+        return 2
+    rows, only_old, only_new = compare_stores(
+        old_store, new_store, metric=args.metric, threshold=args.threshold, alpha=args.alpha
+    )
+    counts = {"speedup": 0, "slowdown": 0, "unchanged": 0}
+    for row in rows:
+        counts[row["status"]] += 1
+        if args.all or row["status"] != "unchanged":
+            print(format_row(row))
+    for config in only_old:
+        print(f"missing   {format_config(config)} (only in {args.old})")
+    for config in only_new:
+        print(f"new       {format_config(config)} (only in {args.new})")
+    print(
+        f"\n{len(rows)} matched: {counts['speedup']} faster, {counts['slowdown']} slower, "
+        f"{counts['unchanged']} unchanged; {len(only_old)} missing, {len(only_new)} new."
+    )
+    return 1 if counts["slowdown"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import html
+import json
+import re
+import sys
+
+from results import CONFIG_FIELDS, config_key, load_runs, open_snapshot
+
+
+DEFAULT_OUTPUT = "dashboard.html"
+# Significant digits kept per value; timings are printed with ~6 digits and
+# the run-to-run noise is far above 0.01%.
+PRECISION = 5
+
+STRING_FIELDS = ("version",)
+
+
+def round_value(value):
+    if value is None:
+        return None
+    return float(f"{value:.{PRECISION}g}")
+
+
+def build_columns(records):
+    """
+    Encode runs column by column: one array per field and metric, with
+    string fields dictionary-encoded as indices into "dicts".
+    """
+    metrics = sorted({name for record in records for name in record["metrics"]})
+    dicts = {field: sorted({str(r["config"][field]) for r in records}) for field in STRING_FIELDS}
+    lookup = {field: {value: idx for idx, value in enumerate(values)} for field, values in dicts.items()}
+    columns = {field: [] for field in (*CONFIG_FIELDS, "run", *metrics)}
+    run_counts = {}
+    for record in records:
+        config = record["config"]
+        key = config_key(config)
+        run_counts[key] = run_counts.get(key, 0) + 1
+        for field in CONFIG_FIELDS:
+            value = config[field]
+            if field in lookup:
+                value = lookup[field][str(value)]
+            columns[field].append(value)
+        columns["run"].append(run_counts[key])
+        for name in metrics:
+            columns[name].append(round_value(record["metrics"].get(name)))
+    return {
+        "fields": list(CONFIG_FIELDS),
+        "metrics": metrics,
+        "dicts": dicts,
+        "length": len(records),
+        "columns": columns,
+    }
+
+
+def render_dashboard(data, title):
+    # "</" cannot appear inside the inline <script> element.
+    payload = json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+    values = {"TITLE": html.escape(title), "DATA": payload}
+    # One pass, so a title containing "__DATA__" is not substituted again.
+    return re.sub(r"__(TITLE|DATA)__", lambda match: values[match.group(1)], HTML_TEMPLATE)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Write a self-contained HTML dashboard of a results snapshot.")
+    parser.add_argument("snapshot", help="results directory or git REV[:PATH]")
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_OUTPUT, help="output HTML file (default: %(default)s)"
+    )
+    parser.add_argument("--title", help="page title (default: the snapshot name)")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    try:
+        with open_snapshot(args.snapshot) as root:
+            records = load_runs(root)
+    except ValueError as exc:
+        print(exc)
+        return 2
+    if not records:
+        print(f"No runs found in {args.snapshot}")
+        return 1
+    data = build_columns(records)
+    generated = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    title = args.title or f"Results: {args.snapshot}"
+    page = render_dashboard(data, f"{title} ({generated})")
+    with open(args.output, "w", encoding="utf-8") as handle:
+        handle.write(page)
+    print(f"Wrote {args.output}: {data['length']} runs, {len(page) // 1024} KiB")
+    return 0
+
+
+HTML_TEMPLATE = r"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+body { font-family: sans-serif; margin: 16px; color: #222; }
+h1 { font-size: 18px; margin: 0 0 12px; }
+#controls { display: flex; flex-wrap: wrap; gap: 12px; align-items: flex-start; margin-bottom: 12px; }
+#controls label { display: flex; flex-direction: column; font-size: 12px; gap: 2px; }
+#controls select[multiple] { min-width: 110px; height: 96px; }
+#chart { border: 1px solid #ddd; }
+#legend { font-size: 12px; margin: 6px 0 12px; }
+#legend span { display: inline-block; margin-right: 14px; }
+#legend i { display: inline-block; width: 10px; height: 10px; margin-right: 4px; }
+table { border-collapse: collapse; font-size: 12px; }
+th, td { border: 1px solid #ddd; padding: 3px 6px; text-align: right; }
+th { background: #f4f4f4; cursor: pointer; user-select: none; }
+td.text { text-align: left; }
+#summary { font-size: 12px; color: #555; margin: 6px 0; }
+</style>
+</head>
+<body>
+<h1>__TITLE__</h1>
+<div id="controls"></div>
+<svg id="chart" width="960" height="440"></svg>
+<div id="legend"></div>
+<div id="summary"></div>
+<table id="table"></table>
+<script>
+const DATA = __DATA__;
+const FIELDS = DATA.fields;
+const COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+
+function decodeRows() {
+  const rows = [];
+  for (let i = 0; i < DATA.length; i++) {
+    const row = {};
+    for (const name of [...FIELDS, "run", ...DATA.metrics]) {
+      let value = DATA.columns[name][i];
+      if (DATA.dicts[name]) value = DATA.dicts[name][value];
+      row[name] = value;
+    }
+    rows.push(row);
+  }
+  return rows;
+}
+
+const ROWS = decodeRows();
+const state = { sortKey: null, sortDesc: false };
+
+function distinct(field) {
+  const values = [...new Set(ROWS.map(r => r[field]))];
+  return values.sort((a, b) => (a === null) - (b === null) || (a < b ? -1 : a > b ? 1 : 0));
+}
+
+function fmt(value) {
+  if (value === null || value === undefined) return "-";
+  if (typeof value !== "number") return String(value);
+  return Math.abs(value) >= 100 ? value.toFixed(1) : value.toPrecision(4);
+}
+
+function addSelect(id, label, options, multiple) {
+  const wrap = document.createElement("label");
+  wrap.textContent = label;
+  const select = document.createElement("select");
+  select.id = id;
+  select.multiple = multiple;
+  for (const [value, text] of options) {
+    const option = document.createElement("option");
+    option.value = JSON.stringify(value);
+    option.textContent = text;
+    option.selected = multiple;
+    select.appendChild(option);
+  }
+  select.addEventListener("change", render);
+  wrap.appendChild(select);
+  document.getElementById("controls").appendChild(wrap);
+  return select;
+}
+
+function selected(id) {
+  return [...document.getElementById(id).selectedOptions].map(o => JSON.parse(o.value));
+}
+
+function buildControls() {
+  const metrics = DATA.metrics.map(m => [m, m]);
+  const preferred = ["loop", "total"].find(m => DATA.metrics.includes(m)) || DATA.metrics[0];
+  addSelect("metric", "metric", metrics, false).value = JSON.stringify(preferred);
+  const axes = FIELDS.filter(f => f !== "version" && distinct(f).length > 1);
+  const xField = addSelect("xfield", "x axis", axes.map(f => [f, f]), false);
+  if (axes.includes("block_size")) xField.value = JSON.stringify("block_size");
+  addSelect("agg", "aggregate", [["median", "median"], ["mean", "mean"], ["min", "min"]], false);
+  addSelect("scale", "y scale", [["linear", "linear"], ["log", "log"]], false);
+  addSelect("view", "table", [["configs", "per config"], ["runs", "per run"]], false);
+  for (const field of FIELDS) {
+    const values = distinct(field);
+    if (values.length > 1) addSelect("filter-" + field, field, values.map(v => [v, v === null ? "-" : String(v)]), true);
+  }
+}
+
+function filteredRows() {
+  const metric = selected("metric")[0];
+  return ROWS.filter(row => {
+    if (row[metric] === null) return false;
+    for (const field of FIELDS) {
+      const el = document.getElementById("filter-" + field);
+      if (el && !selected("filter-" + field).includes(row[field])) return false;
+    }
+    return true;
+  });
+}
+
+function stats(values) {
+  const sorted = [...values].sort((a, b) => a - b);
+  const n = sorted.length;
+  const mean = sorted.reduce((a, b) => a + b, 0) / n;
+  const mid = Math.floor(n / 2);
+  const median = n % 2 ? sorted[mid] : (sorted[mid - 1] + sorted[mid]) / 2;
+  const variance = n > 1 ? sorted.reduce((a, b) => a + (b - mean) ** 2, 0) / (n - 1) : 0;
+  return { n, mean, median, stdev: Math.sqrt(variance), min: sorted[0], max: sorted[n - 1] };
+}
+
+function groupBy(rows, keyFn) {
+  const groups = new Map();
+  for (const row of rows) {
+    const key = keyFn(row);
+    if (!groups.has(key)) groups.set(key, []);
+    groups.get(key).push(row);
+  }
+  return groups;
+}
+
+function svgEl(name, attrs, text) {
+  const el = document.createElementNS("http://www.w3.org/2000/svg", name);
+  for (const [k, v] of Object.entries(attrs)) el.setAttribute(k, v);
+  if (text !== undefined) el.textContent = text;
+  return el;
+}
+
+function renderChart(rows) {
+  const svg = document.getElementById("chart");
+  svg.innerHTML = "";
+  const legend = document.getElementById("legend");
+  legend.innerHTML = "";
+  const metric = selected("metric")[0];
+  const xField = selected("xfield")[0];
+  const agg = selected("agg")[0];
+  const logScale = selected("scale")[0] === "log";
+  if (!rows.length || !xField) return;
+  // Every field that still varies, apart from the x axis, splits the series.
+  const seriesFields = FIELDS.filter(f => f !== xField && new Set(rows.map(r => r[f])).size > 1);
+  const seriesKey = row => seriesFields.map(f => (f === "version" ? "" : f + "=") + row[f]).join(" ") || metric;
+  const xs = [...new Set(rows.map(r => r[xField]))].filter(x => x !== null).sort((a, b) => a - b);
+  const series = [];
+  for (const [name, group] of groupBy(rows, seriesKey)) {
+    const points = [];
+    for (const [x, runs] of groupBy(group, r => r[xField])) {
+      if (x === null) continue;
+      const s = stats(runs.map(r => r[metric]));
+      points.push({ x, y: s[agg], lo: s.min, hi: s.max, n: s.n });
+    }
+    points.sort((a, b) => a.x - b.x);
+    if (points.length) series.push({ name, points });
+  }
+  const width = +svg.getAttribute("width"), height = +svg.getAttribute("height");
+  const pad = { left: 70, right: 20, top: 20, bottom: 45 };
+  const all = series.flatMap(s => s.points.flatMap(p => [p.lo, p.hi]));
+  let yMin = logScale ? Math.min(...all.filter(v => v > 0)) : 0;
+  let yMax = Math.max(...all);
+  if (!(yMax > yMin)) yMax = yMin + 1;
+  const ty = logScale ? v => Math.log10(Math.max(v, yMin)) : v => v;
+  const y0 = ty(yMin), y1 = ty(yMax) + (ty(yMax) - ty(yMin)) * 0.05;
+  const sx = i => pad.left + (xs.length > 1 ? i * (width - pad.left - pad.right) / (xs.length - 1) : (width - pad.left - pad.right) / 2);
+  const sy = v => height - pad.bottom - (ty(v) - y0) / (y1 - y0) * (height - pad.top - pad.bottom);
+  const xIndex = new Map(xs.map((x, i) => [x, i]));
+  svg.appendChild(svgEl("line", { x1: pad.left, y1: height - pad.bottom, x2: width - pad.right, y2: height - pad.bottom, stroke: "#333" }));
+  svg.appendChild(svgEl("line", { x1: pad.left, y1: pad.top, x2: pad.left, y2: height - pad.bottom, stroke: "#333" }));
+  for (let i = 0; i <= 5; i++) {
+    const t = y0 + (y1 - y0) * i / 5;
+    const v = logScale ? 10 ** t : t;
+    const y = sy(v);
+    svg.appendChild(svgEl("line", { x1: pad.left, y1: y, x2: width - pad.right, y2: y, stroke: "#eee" }));
+    svg.appendChild(svgEl("text", { x: pad.left - 6, y: y + 4, "text-anchor": "end", "font-size": 11 }, fmt(v)));
+  }
+  xs.forEach((x, i) => svg.appendChild(svgEl("text", { x: sx(i), y: height - pad.bottom + 16, "text-anchor": "middle", "font-size": 11 }, String(x))));
+  svg.appendChild(svgEl("text", { x: (width + pad.left) / 2, y: height - 8, "text-anchor": "middle", "font-size": 12 }, xField));
+  svg.appendChild(svgEl("text", { x: 14, y: height / 2, "text-anchor": "middle", "font-size": 12, transform: `rotate(-90 14 ${height / 2})` }, `${metric} (ms, ${agg})`));
+  series.forEach((s, idx) => {
+    const color = COLORS[idx % COLORS.length];
+    const path = s.points.map((p, i) => `${i ? "L" : "M"}${sx(xIndex.get(p.x))},${sy(p.y)}`).join("");
+    svg.appendChild(svgEl("path", { d: path, fill: "none", stroke: color, "stroke-width": 2 }));
+    for (const p of s.points) {
+      const cx = sx(xIndex.get(p.x));
+      if (p.n > 1) svg.appendChild(svgEl("line", { x1: cx, y1: sy(p.lo), x2: cx, y2: sy(p.hi), stroke: color }));
+      const dot = svgEl("circle", { cx, cy: sy(p.y), r: 4, fill: color });
+      dot.appendChild(svgEl("title", {}, `${s.name}\n${xField}=${p.x}\n${agg}=${fmt(p.y)} ms (n=${p.n}, ${fmt(p.lo)}-${fmt(p.hi)})`));
+      svg.appendChild(dot);
+    }
+    const item = document.createElement("span");
+    item.innerHTML = `<i style="background:${color}"></i>`;
+    item.appendChild(document.createTextNode(s.name));
+    legend.appendChild(item);
+  });
+}
+
+function renderTable(rows) {
+  const metric = selected("metric")[0];
+  const perRun = selected("view")[0] === "runs";
+  let columns, body;
+  if (perRun) {
+    columns = [...FIELDS, "run", ...DATA.metrics];
+    body = rows.map(r => columns.map(c => r[c]));
+  } else {
+    columns = [...FIELDS, "n", "median", "mean", "stdev", "min", "max"];
+    body = [];
+    for (const group of groupBy(rows, r => FIELDS.map(f => r[f]).join("|")).values()) {
+      const s = stats(group.map(r => r[metric]));
+      body.push([...FIELDS.map(f => group[0][f]), s.n, s.median, s.mean, s.stdev, s.min, s.max]);
+    }
+  }
+  const sortIdx = columns.indexOf(state.sortKey);
+  if (sortIdx >= 0) {
+    body.sort((a, b) => {
+      const x = a[sortIdx], y = b[sortIdx];
+      const cmp = (x === null) - (y === null) || (x < y ? -1 : x > y ? 1 : 0);
+      return state.sortDesc ? -cmp : cmp;
+    });
+  }
+  const table = document.getElementById("table");
+  table.innerHTML = "";
+  const head = table.insertRow();
+  for (const c of columns) {
+    const th = document.createElement("th");
+    th.textContent = c + (c === state.sortKey ? (state.sortDesc ? " ▼" : " ▲") : "");
+    th.addEventListener("click", () => {
+      state.sortDesc = state.sortKey === c ? !state.sortDesc : false;
+      state.sortKey = c;
+      render();
+    });
+    head.appendChild(th);
+  }
+  for (const values of body) {
+    const tr = table.insertRow();
+    values.forEach(v => {
+      const td = tr.insertCell();
+      td.textContent = fmt(v);
+      if (typeof v !== "number") td.className = "text";
+    });
+  }
+  document.getElementById("summary").textContent = `${rows.length} of ${ROWS.length} runs, ${body.length} rows`;
+}
+
+function render() {
+  const rows = filteredRows();
+  renderChart(rows);
+  renderTable(rows);
+}
+
+buildControls();
+render();
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
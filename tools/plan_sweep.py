@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import math
+import os
+import posixpath
+import shlex
+import sys
+from pathlib import Path
+
+from results import (
+    CONFIG_FIELDS,
+    config_key,
+    format_config,
+    format_config_name,
+    load_results,
+    open_snapshot,
+    summarize,
+)
+
+
+DEFAULT_RESULTS_DIR = "results"
+DEFAULT_WALLTIME = "02:00:00"
+DEFAULT_RUNTIME = 60.0
+DEFAULT_RUN_OVERHEAD = 5.0
+# Keep some slack in every job: estimates come from earlier runs on a
+# shared machine and PBS kills the job when the walltime is exceeded.
+WALLTIME_FILL = 0.8
+MIN_WALLTIME = 300
+
+JOB_TEMPLATE = """#!/bin/bash
+
+## Give the Job a descriptive name
+#PBS -N {job_name}
+
+## Output and error files
+#PBS -o {log_dir}/{job_name}.out
+#PBS -e {log_dir}/{job_name}.err
+
+## How many machines should we get?
+#PBS -l {resources}
+
+##How long should the job run for?
+#PBS -l walltime={walltime}
+
+## Start
+## Generated by tools/plan_sweep.py from {spec_name}
+
+cd {workdir}
+{setup}
+"""
+
+
+def parse_walltime(text):
+    seconds = 0
+    for part in str(text).split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def format_walltime(seconds):
+    seconds = int(math.ceil(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def load_spec(path):
+    with open(path, "r", encoding="utf-8") as handle:
+        spec = json.load(handle)
+    for field in ("name", "workdir", "versions"):
+        if field not in spec:
+            raise ValueError(f"{path}: missing '{field}'")
+    if not posixpath.isabs(spec["workdir"]):
+        raise ValueError(f"{path}: 'workdir' must be an absolute path")
+    for version, meta in spec["versions"].items():
+        if "command" not in meta:
+            raise ValueError(f"{path}: version '{version}' has no 'command'")
+    return spec
+
+
+def expand_configs(spec):
+    configs = []
+    for version, meta in spec["versions"].items():
+        params = dict(spec.get("params", {}))
+        params.update(meta.get("params", {}))
+        fields = [f for f in CONFIG_FIELDS[1:] if f in params]
+        for values in itertools.product(*(params[f] for f in fields)):
+            config = {field: None for field in CONFIG_FIELDS}
+            config["version"] = version
+            config.update(zip(fields, values))
+            configs.append(config)
+    return configs
+
+
+def load_config_list(path, spec):
+    """Read explicit configurations, e.g. the --json output of autotune.py."""
+    with open(path, "r", encoding="utf-8") as handle:
+        entries = json.load(handle)
+    configs = []
+    for entry in entries:
+        if entry.get("version") not in spec["versions"]:
+            print(f"Skipping {format_config(entry)}: version not in {spec['name']}")
+            continue
+        config = {field: entry.get(field) for field in CONFIG_FIELDS}
+        if "repetitions" in entry:
+            config["repetitions"] = entry["repetitions"]
+        configs.append(config)
+    return configs
+
+
+def estimate_runtime(entry, overhead):
+    # total is the timed part of one run in ms; dataset generation and
+    # process startup are covered by the per-run overhead.
+    stats = summarize(entry["samples"].get("total", []))
+    if stats is None:
+        return None
+    return stats["max"] / 1000.0 + overhead
+
+
+def plan_runs(spec, configs, store):
+    repetitions = spec.get("repetitions", 1)
+    overhead = spec.get("run_overhead", DEFAULT_RUN_OVERHEAD)
+    default_runtime = spec.get("default_runtime", DEFAULT_RUNTIME)
+    version_worst = {}
+    for entry in store.values():
+        runtime = estimate_runtime(entry, overhead)
+        if runtime is not None:
+            version = entry["config"]["version"]
+            version_worst[version] = max(version_worst.get(version, 0.0), runtime)
+    runs = []
+    skipped = 0
+    for config in configs:
+        config = dict(config)
+        target = config.pop("repetitions", repetitions)
+        entry = store.get(config_key(config))
+        done = len(entry["samples"].get("total", [])) if entry else 0
+        if done >= target:
+            skipped += 1
+            continue
+        runtime = estimate_runtime(entry, overhead) if entry else None
+        if runtime is None:
+            # Unseen configurations get the slowest runtime seen for the
+            # same version, which errs on the side of a longer job.
+            runtime = version_worst.get(config["version"], default_runtime)
+        for _ in range(target - done):
+            runs.append({"config": config, "runtime": runtime})
+    return runs, skipped
+
+
+def pack_jobs(runs, capacity):
+    """First-fit decreasing bin packing of runs into jobs of at most capacity seconds."""
+    jobs = []
+    order = sorted(range(len(runs)), key=lambda i: -runs[i]["runtime"])
+    for idx in order:
+        run = runs[idx]
+        for job in jobs:
+            if job["runtime"] + run["runtime"] <= capacity:
+                break
+        else:
+            job = {"runtime": 0.0, "runs": []}
+            jobs.append(job)
+        job["runs"].append((idx, run))
+        job["runtime"] += run["runtime"]
+    for job in jobs:
+        # Run in sweep order inside each job so logs grow predictably.
+        job["runs"] = [run for _, run in sorted(job["runs"], key=lambda item: item[0])]
+    return jobs
+
+
+def format_fields(config):
+    fields = {k: v for k, v in config.items() if v is not None}
+    if config.get("threads"):
+        fields["last_cpu"] = config["threads"] - 1
+    return fields
+
+
+def render_run(spec, run):
+    config = run["config"]
+    meta = spec["versions"][config["version"]]
+    fields = format_fields(config)
+    results_dir = spec.get("results_dir", DEFAULT_RESULTS_DIR)
+    prefix = f"{results_dir}/{config['version']}/{format_config_name(config)}"
+    env = " ".join(
+        f"{name}={shlex.quote(str(value).format(**fields))}"
+        for name, value in {**spec.get("env", {}), **meta.get("env", {})}.items()
+    )
+    command = meta["command"].format(**fields)
+    if env:
+        command = f"env {env} {command}"
+    return f'{command} >> "{prefix}.out" 2>> "{prefix}.err"'
+
+
+def job_log_dir(spec):
+    # PBS resolves relative -o/-e paths against the directory qsub runs in,
+    # i.e. the generated scripts directory, so anchor them at the workdir.
+    log_dir = spec.get("job_log_dir", spec.get("results_dir", DEFAULT_RESULTS_DIR))
+    return posixpath.join(spec["workdir"], log_dir)
+
+
+def render_job(spec, spec_name, job_name, job, walltime):
+    results_dir = spec.get("results_dir", DEFAULT_RESULTS_DIR)
+    versions = sorted({run["config"]["version"] for run in job["runs"]})
+    setup = list(spec.get("setup", []))
+    setup.append("mkdir -p " + " ".join(shlex.quote(f"{results_dir}/{v}") for v in versions))
+    script = JOB_TEMPLATE.format(
+        job_name=job_name,
+        log_dir=job_log_dir(spec),
+        resources=spec.get("resources", "nodes=1:ppn=1"),
+        walltime=walltime,
+        spec_name=spec_name,
+        workdir=spec["workdir"],
+        setup="\n".join(setup),
+    )
+    lines = [script]
+    for run in job["runs"]:
+        lines.append(render_run(spec, run))
+    return "\n".join(lines) + "\n"
+
+
+def write_jobs(spec, spec_name, jobs, out_dir, max_walltime):
+    out_dir.mkdir(parents=True, exist_ok=True)
+    qsub_args = spec.get("qsub_args", "")
+    # PBS cannot write the job's -o/-e files into a missing directory.
+    submit = ["#!/bin/bash", 'cd "$(dirname "$0")"', f"mkdir -p {shlex.quote(job_log_dir(spec))}", ""]
+    for idx, job in enumerate(jobs):
+        job_name = f"{spec['name']}_{idx:03d}"
+        walltime = format_walltime(min(max_walltime, max(MIN_WALLTIME, job["runtime"] / WALLTIME_FILL)))
+        path = out_dir / f"{job_name}.sh"
+        path.write_text(render_job(spec, spec_name, job_name, job, walltime))
+        path.chmod(0o755)
+        submit.append(f"qsub {qsub_args} {path.name}".replace("  ", " "))
+    submit_path = out_dir / "submit.sh"
+    submit_path.write_text("\n".join(submit) + "\n")
+    submit_path.chmod(0o755)
+    return submit_path
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Plan a PBS sweep from a declarative spec and write job scripts.")
+    parser.add_argument("spec", help="sweep spec (JSON)")
+    parser.add_argument("--results", help="results directory or git REV[:PATH] with earlier runs")
+    parser.add_argument("--only", metavar="FILE", help="plan only the configurations listed in FILE (JSON)")
+    parser.add_argument("--out-dir", help="where to write the job scripts (default: scripts/<name>)")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without writing scripts")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    try:
+        spec = load_spec(args.spec)
+        store = {}
+        if args.results:
+            with open_snapshot(args.results) as root:
+                store = load_results(root)
+    except (OSError, ValueError) as exc:
+        print(exc)
+        return 2
+    configs = load_config_list(args.only, spec) if args.only else expand_configs(spec)
+    runs, skipped = plan_runs(spec, configs, store)
+    max_walltime = parse_walltime(spec.get("walltime", DEFAULT_WALLTIME))
+    capacity = max_walltime * WALLTIME_FILL
+    for run in runs:
+        if run["runtime"] > capacity:
+            print(f"Warning: {format_config(run['config'])} may not fit in {spec.get('walltime', DEFAULT_WALLTIME)}")
+    jobs = pack_jobs(runs, capacity)
+    print(
+        f"{len(configs)} configurations, {skipped} already complete, "
+        f"{len(runs)} runs packed into {len(jobs)} jobs."
+    )
+    for idx, job in enumerate(jobs):
+        print(f"  job {idx:03d}: {len(job['runs'])} runs, ~{format_walltime(job['runtime'])}")
+    if args.dry_run or not jobs:
+        return 0
+    out_dir = Path(args.out_dir or os.path.join("scripts", spec["name"]))
+    submit_path = write_jobs(spec, os.path.basename(args.spec), jobs, out_dir, max_walltime)
+    print(f"Wrote {len(jobs)} job scripts; submit them with {submit_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Span timing, cProfile and tracemalloc capture behind --profile (see tools/README.md)."""
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+PROFILE_FLAGS = ("--profile", "--cprofile", "--tracemalloc")
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+# Call-graph branches below this share of the total are folded into their parent.
+MIN_FLAME_SHARE = 0.001
+MAX_FLAME_DEPTH = 64
+TOP_ALLOCATIONS = 10
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.counters = []
+        self.cprofile = None
+        self.tracemalloc = False
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.origin
+
+    def record(self, name, start, end, args=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.spans.append({
+                "name": name,
+                "start": start,
+                "end": end,
+                "tid": threading.get_ident(),
+                "args": args or {},
+            })
+            if self.tracemalloc:
+                current, peak = tracemalloc.get_traced_memory()
+                self.counters.append((end, current, peak))
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        if not self.enabled:
+            yield
+            return
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, start, self.now(), args)
+
+    def start(self, trace_path, use_cprofile=False, use_tracemalloc=False):
+        self.enabled = True
+        self.trace_path = trace_path
+        self.origin = time.perf_counter()
+        if use_tracemalloc:
+            tracemalloc.start()
+            self.tracemalloc = True
+        if use_cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        atexit.register(self.finish)
+
+    def finish(self):
+        if not self.enabled:
+            return
+        end = self.now()
+        self.enabled = False
+        stats = None
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            stats = pstats.Stats(self.cprofile)
+            stats.dump_stats(f"{output_stem(self.trace_path)}.prof")
+        top_allocations = []
+        if self.tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            top_allocations = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            tracemalloc.stop()
+        write_json(self.trace_path, chrome_trace(self.spans, self.counters))
+        speedscope_path = f"{output_stem(self.trace_path)}.speedscope.json"
+        write_json(speedscope_path, speedscope(self.spans, stats, end))
+        print_report(self.spans, stats, top_allocations, [self.trace_path, speedscope_path])
+
+
+PROFILER = Profiler()
+
+
+def span(name, **args):
+    return PROFILER.span(name, **args)
+
+
+def record(name, start, end, **args):
+    """Add a span measured by the caller (times from now())."""
+    PROFILER.record(name, start, end, args)
+
+
+def now():
+    return PROFILER.now()
+
+
+def traced(name):
+    """Decorator: run the function inside span(name, function=...)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER.span(name, function=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def configure(argv, tool=None):
+    """Strip the profiling flags from argv, start profiling if any was given and return the rest."""
+    rest = []
+    trace_path = None
+    flags = set()
+    for arg in argv:
+        name, _, value = arg.partition("=")
+        if name not in PROFILE_FLAGS:
+            rest.append(arg)
+            continue
+        flags.add(name)
+        if name == "--profile" and value:
+            trace_path = value
+    if flags:
+        tool = tool or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "profile"
+        PROFILER.start(
+            trace_path or f"{tool}.trace.json",
+            use_cprofile="--cprofile" in flags,
+            use_tracemalloc="--tracemalloc" in flags,
+        )
+    return rest
+
+
+def output_stem(trace_path):
+    """foo.trace.json -> foo, the prefix of the .speedscope.json and .prof siblings."""
+    stem = trace_path[:-5] if trace_path.endswith(".json") else trace_path
+    return stem[:-6] if stem.endswith(".trace") else stem
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, separators=(",", ":"))
+
+
+def chrome_trace(spans, counters):
+    pid = os.getpid()
+    events = [{"ph": "M", "pid": pid, "name": "process_name", "args": {"name": os.path.basename(sys.argv[0])}}]
+    for item in spans:
+        events.append({
+            "ph": "X",
+            "pid": pid,
+            "tid": item["tid"],
+            "name": item["name"],
+            "ts": item["start"] * 1e6,
+            "dur": (item["end"] - item["start"]) * 1e6,
+            "args": {key: str(value) for key, value in item["args"].items()},
+        })
+    for at, current, peak in counters:
+        events.append({
+            "ph": "C",
+            "pid": pid,
+            "name": "python memory (KiB)",
+            "ts": at * 1e6,
+            "args": {"current": current / 1024.0, "peak": peak / 1024.0},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def span_label(item):
+    details = ", ".join(f"{key}={value}" for key, value in item["args"].items())
+    return f"{item['name']} ({details})" if details else item["name"]
+
+
+def speedscope(spans, stats, end):
+    frames = []
+    frame_index = {}
+
+    def frame(key, **fields):
+        if key not in frame_index:
+            frame_index[key] = len(frames)
+            frames.append(fields)
+        return frame_index[key]
+
+    profiles = []
+    main_thread = threading.main_thread().ident
+    events = []
+    for item in spans:
+        if item["tid"] != main_thread:
+            continue
+        idx = frame(("span", span_label(item)), name=span_label(item))
+        # Open/close at equal times: close first, and the enclosing span
+        # (longer) opens before the enclosed one and closes after it.
+        length = item["end"] - item["start"]
+        events.append((item["start"] * 1000.0, 1, -length, "O", idx))
+        events.append((item["end"] * 1000.0, 0, length, "C", idx))
+    if events:
+        events.sort()
+        profiles.append({
+            "type": "evented",
+            "name": "spans",
+            "unit": "milliseconds",
+            "startValue": 0.0,
+            "endValue": end * 1000.0,
+            "events": [{"type": kind, "frame": idx, "at": at} for at, _, _, kind, idx in events],
+        })
+    if stats is not None:
+        samples, weights = flame_samples(stats, frame)
+        profiles.append({
+            "type": "sampled",
+            "name": "cProfile",
+            "unit": "seconds",
+            "startValue": 0.0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        })
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": os.path.basename(sys.argv[0]),
+        "exporter": "tools/profiling.py",
+    }
+
+
+def flame_samples(stats, frame):
+    """
+    Turn cProfile's caller/callee totals into weighted stacks. Time spent in
+    a function is split between its callers in proportion to what each of
+    them accounts for, which is exact for trees and an estimate otherwise.
+    """
+    entries = stats.stats
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    # Calls made from frames entered before profiling started (main() itself)
+    # are not recorded as edges; whatever time the callers do not explain
+    # becomes a root.
+    roots = []
+    for func, (_, _, _, ct, callers) in entries.items():
+        outside = ct - sum(edge[3] for caller, edge in callers.items() if caller != func)
+        if outside > ct * 1e-6:
+            roots.append((func, outside))
+    total = sum(ct for _, ct in roots) or 1.0
+    samples = []
+    weights = []
+
+    def frame_of(func):
+        filename, line, name = func
+        return frame(("func", func), name=name, file=filename, line=line)
+
+    def expand(func, budget, stack):
+        stack = stack + [frame_of(func)]
+        # Recursive calls are already part of the outer call's time.
+        children = [
+            (callee, edge_time)
+            for callee, edge_time in callees.get(func, [])
+            if callee in entries and frame_of(callee) not in stack
+        ]
+        tt = entries[func][2]
+        known = tt + sum(edge_time for _, edge_time in children)
+        scale = budget / known if known > 0 else 0.0
+        self_time = tt * scale
+        if len(stack) < MAX_FLAME_DEPTH:
+            for callee, edge_time in children:
+                share = edge_time * scale
+                if share >= total * MIN_FLAME_SHARE:
+                    expand(callee, share, stack)
+                else:
+                    self_time += share
+        else:
+            self_time = budget
+        if self_time > 0:
+            samples.append(stack)
+            weights.append(self_time)
+
+    for func, ct in roots:
+        expand(func, ct, [])
+    return samples, weights
+
+
+def print_report(spans, stats, top_allocations, paths):
+    totals = {}
+    for item in spans:
+        total = totals.setdefault(item["name"], [0, 0.0])
+        total[0] += 1
+        total[1] += item["end"] - item["start"]
+    out = sys.stderr
+    print("\nProfile (inclusive time per span):", file=out)
+    for name, (count, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"  {name:<24} {count:>6}x {seconds * 1000.0:>12.1f} ms", file=out)
+    if stats is not None:
+        print("\nTop functions by cumulative time:", file=out)
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(15)
+    if top_allocations:
+        print("Top allocation sites:", file=out)
+        for stat in top_allocations:
+            print(f"  {stat}", file=out)
+    print(f"Wrote {', '.join(paths)}", file=out)
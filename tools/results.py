@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CONFIG_FIELDS = ("version", "size", "coords", "clusters", "block_size", "threads")
+PRIMARY_METRICS = ("loop", "total")
+SUMMARY_STATS = ("n", "mean", "median", "stdev", "min", "max")
+SUMMARY_FORMAT = "results-summary/1"
+SUMMARY_NAME = "results_summary.json"
+
+# Tags used in result file names, e.g. Sz-1024_Coo-32_Cl-64_Bs-256.out
+NAME_TAGS = {
+    "size": "Sz",
+    "coords": "Coo",
+    "clusters": "Cl",
+    "block_size": "Bs",
+    "threads": "Th",
+}
+# FW job outputs are named <N>_<threads>_B<B>.out by a2/FW/experiments.sh
+FW_NAME_RE = re.compile(r"^(\d+)_(\d+)_B(\d+)$")
+
+DATASET_RE = re.compile(
+    r"dataset_size\s*=\s*([0-9.]+)\s*MB\s+numObjs\s*=\s*(\d+)\s+"
+    r"numCoords\s*=\s*(\d+)\s+numClusters\s*=\s*(\d+)"
+    r"(?:,\s*block_size\s*=\s*(\d+))?"
+)
+THREADS_RE = re.compile(r"\(number of threads:\s*(\d+)\)")
+GPU_RUN_RE = re.compile(r"nloops\s*=\s*(\d+)\s*:\s*total\s*=\s*([0-9.]+)\s*ms")
+OMP_RUN_RE = re.compile(
+    r"nloops\s*=\s*(\d+)\s*\(total\s*=\s*([0-9.]+)s\)\s*\(per loop\s*=\s*([0-9.]+)s\)"
+)
+FW_RUN_RE = re.compile(r"^(FW(?:_SR|_TILED)?),(\d+),(?:(\d+),)?([0-9.]+)\s*$", re.MULTILINE)
+GPU_METRICS = {
+    "loop": r"t_loop_avg\s*=\s*([0-9.]+)\s*ms",
+    "loop_min": r"t_loop_min\s*=\s*([0-9.]+)\s*ms",
+    "loop_max": r"t_loop_max\s*=\s*([0-9.]+)\s*ms",
+    "cpu": r"t_cpu_avg\s*=\s*([0-9.]+)\s*ms",
+    "gpu": r"t_gpu_avg\s*=\s*([0-9.]+)\s*ms",
+    "transfers": r"t_transfers_avg\s*=\s*([0-9.]+)\s*ms",
+}
+
+
+def parse_name_config(path):
+    config = {}
+    stem = path.stem
+    for field, tag in NAME_TAGS.items():
+        match = re.search(rf"(?:^|_){tag}-(\d+)", stem)
+        if match:
+            config[field] = int(match.group(1))
+    match = FW_NAME_RE.match(stem)
+    if match:
+        config.setdefault("threads", int(match.group(2)))
+        config.setdefault("block_size", int(match.group(3)))
+    return config
+
+
+def format_config_name(config):
+    parts = []
+    for field, tag in NAME_TAGS.items():
+        value = config.get(field)
+        if value is not None:
+            parts.append(f"{tag}-{value}")
+    return "_".join(parts)
+
+
+def config_key(config):
+    return tuple(config.get(field) for field in CONFIG_FIELDS)
+
+
+def sort_config_key(key):
+    return tuple((value is None, value) for value in key)
+
+
+def format_config(config):
+    parts = [str(config.get("version"))]
+    for field in CONFIG_FIELDS[1:]:
+        value = config.get(field)
+        if value is not None:
+            parts.append(f"{field}={value}")
+    return " ".join(parts)
+
+
+def split_runs(text, run_re):
+    """
+    Split an appended-to log into (match, head, tail) per run: head is the
+    text since the previous summary, tail runs up to the next summary line.
+    """
+    matches = list(run_re.finditer(text))
+    runs = []
+    for idx, match in enumerate(matches):
+        start = matches[idx - 1].end() if idx else 0
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(text)
+        runs.append((match, text[start:match.start()], text[match.start():end]))
+    return runs
+
+
+def parse_header(text):
+    header = {}
+    match = DATASET_RE.search(text)
+    if match:
+        header["size"] = int(round(float(match.group(1))))
+        header["objects"] = int(match.group(2))
+        header["coords"] = int(match.group(3))
+        header["clusters"] = int(match.group(4))
+        if match.group(5):
+            header["block_size"] = int(match.group(5))
+    match = THREADS_RE.search(text)
+    if match:
+        header["threads"] = int(match.group(1))
+    return header
+
+
+def parse_gpu_runs(text):
+    runs = []
+    for match, head, tail in split_runs(text, GPU_RUN_RE):
+        metrics = {"total": float(match.group(2))}
+        nloops = int(match.group(1))
+        for name, pattern in GPU_METRICS.items():
+            found = re.search(pattern, tail)
+            if found:
+                metrics[name] = float(found.group(1))
+        if "loop" not in metrics and nloops:
+            metrics["loop"] = metrics["total"] / nloops
+        runs.append((parse_header(head), nloops, metrics))
+    return runs
+
+
+def parse_omp_runs(text):
+    runs = []
+    for match, head, _ in split_runs(text, OMP_RUN_RE):
+        metrics = {
+            "total": float(match.group(2)) * 1000.0,
+            "loop": float(match.group(3)) * 1000.0,
+        }
+        header = parse_header(head)
+        if "threads" not in header and "Sequential Kmeans" in head:
+            header["threads"] = 1
+        runs.append((header, int(match.group(1)), metrics))
+    return runs
+
+
+def parse_fw_runs(text):
+    runs = []
+    for match in FW_RUN_RE.finditer(text):
+        header = {"version": match.group(1), "size": int(match.group(2))}
+        if match.group(3):
+            header["block_size"] = int(match.group(3))
+        runs.append((header, None, {"total": float(match.group(4)) * 1000.0}))
+    return runs
+
+
+def parse_result_text(text):
+    for parser in (parse_gpu_runs, parse_omp_runs, parse_fw_runs):
+        runs = parser(text)
+        if runs:
+            return runs
+    return []
+
+
+def parse_result_file(path, root=None):
+    """Return one record per run found in a (possibly appended-to) log."""
+    path = Path(path)
+    try:
+        text = path.read_text(errors="replace")
+    except OSError:
+        return []
+    name_config = parse_name_config(path)
+    if root is not None:
+        rel_parent = path.parent.relative_to(root)
+        version = rel_parent.name or path.stem
+    else:
+        version = path.parent.name
+    records = []
+    for header, nloops, metrics in parse_result_text(text):
+        config = {field: None for field in CONFIG_FIELDS}
+        config["version"] = version
+        config.update({k: v for k, v in header.items() if k in CONFIG_FIELDS})
+        # File names are written by the sweep scripts, so they win over the
+        # values echoed by the binary (e.g. the rounded dataset size).
+        config.update(name_config)
+        records.append({
+            "config": config,
+            "nloops": nloops,
+            "objects": header.get("objects"),
+            "metrics": metrics,
+            "path": str(path),
+        })
+    return records
+
+
+def iter_result_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.endswith(".out"):
+                yield Path(dirpath) / name
+
+
+def load_runs(root):
+    """Every run below root as a flat list of records."""
+    root = Path(root)
+    records = []
+    for path in iter_result_files(root):
+        records.extend(parse_result_file(path, root))
+    return records
+
+
+def load_results(root):
+    """Group every run below root by configuration."""
+    store = {}
+    for record in load_runs(root):
+        key = config_key(record["config"])
+        entry = store.setdefault(key, {
+            "config": record["config"],
+            "objects": record["objects"],
+            "samples": {},
+            "nloops": [],
+            "files": [],
+        })
+        if record["nloops"] is not None:
+            entry["nloops"].append(record["nloops"])
+        for name, value in record["metrics"].items():
+            entry["samples"].setdefault(name, []).append(value)
+        if record["path"] not in entry["files"]:
+            entry["files"].append(record["path"])
+    return store
+
+
+def parsed_files(store, root):
+    """The logs a store was built from, relative to root."""
+    return sorted({os.path.relpath(path, root) for entry in store.values() for path in entry["files"]})
+
+
+def primary_metric(entry):
+    for name in PRIMARY_METRICS:
+        if entry["samples"].get(name):
+            return name
+    return None
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        "n": len(values),
+        # Plain sum/len rather than statistics.fmean: this module also runs
+        # on the cluster's older Python (see write_summary).
+        "mean": sum(values) / len(values),
+        "median": statistics.median(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def round_sig(value, digits=6):
+    return float(f"{value:.{digits}g}") if value is not None else None
+
+
+def summary_columns(store):
+    """
+    Aggregate a result store into columns: one list per config field and
+    one list per (metric, statistic), all indexed by configuration.
+    Missing values are null.
+    """
+    keys = sorted(store, key=sort_config_key)
+    metrics = sorted({name for entry in store.values() for name in entry["samples"]})
+    columns = {
+        "format": SUMMARY_FORMAT,
+        "configs": {field: [store[key]["config"].get(field) for key in keys] for field in CONFIG_FIELDS},
+        "objects": [store[key]["objects"] for key in keys],
+        "metrics": {},
+    }
+    for name in metrics:
+        stats = [summarize(store[key]["samples"].get(name, [])) for key in keys]
+        columns["metrics"][name] = {
+            stat: [round_sig(s[stat]) if s and stat != "n" else (s or {}).get(stat) for s in stats]
+            for stat in SUMMARY_STATS
+        }
+    return columns
+
+
+def write_summary(store, path):
+    """
+    Write the columnar summary of a store. Only the standard library is
+    used, so the file can be produced on the cluster by piping this module
+    into `python3 -` (see scirouter/transfer_manager.py).
+    """
+    text = json.dumps(summary_columns(store), separators=(",", ":"))
+    if str(path) == "-":
+        print(text)
+        return
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(text + "\n")
+
+
+def load_summary(path):
+    """Read a summary back as {key: {"config", "objects", "stats": {metric: stats}}}."""
+    with open(path, "r", encoding="utf-8") as handle:
+        columns = json.load(handle)
+    if columns.get("format") != SUMMARY_FORMAT:
+        raise ValueError(f"{path}: not a {SUMMARY_FORMAT} file")
+    store = {}
+    for idx, objects in enumerate(columns["objects"]):
+        config = {field: columns["configs"][field][idx] for field in CONFIG_FIELDS}
+        stats = {}
+        for name, table in columns["metrics"].items():
+            if table["n"][idx]:
+                stats[name] = {stat: table[stat][idx] for stat in SUMMARY_STATS}
+        store[config_key(config)] = {"config": config, "objects": objects, "stats": stats}
+    return store
+
+
+def git(*args, cwd=REPO_ROOT, **kwargs):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs
+    )
+
+
+def split_revision_spec(spec):
+    """Split REV[:PATH] into (rev, path), or None if REV is not a commit."""
+    rev, _, subpath = spec.partition(":")
+    try:
+        git("rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}")
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    return rev, subpath.strip("/")
+
+
+@contextlib.contextmanager
+def open_snapshot(spec):
+    """
+    Yield a directory holding a result snapshot.
+    spec is either a directory or a git revision, optionally REV:PATH.
+    """
+    if os.path.isdir(spec):
+        yield Path(spec)
+        return
+    parsed = split_revision_spec(spec)
+    if parsed is None:
+        raise ValueError(f"Not a directory or git revision: {spec}")
+    rev, subpath = parsed
+    with tempfile.TemporaryDirectory(prefix="results-") as tmp:
+        args = ["archive", "--format=tar", rev]
+        if subpath:
+            args.append(subpath)
+        archive = git(*args).stdout
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            # git archive output is trusted; the filter only exists on Pythons
+            # with the extraction-filter backport (3.12, 3.11.4, 3.10.12, ...).
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp, filter="data")
+            else:
+                tar.extractall(tmp)
+        yield Path(tmp) / subpath if subpath else Path(tmp)
+
+
+def print_summary(stats_by_key):
+    for key in sorted(stats_by_key, key=sort_config_key):
+        config, stats = stats_by_key[key]
+        for metric in PRIMARY_METRICS:
+            if metric in stats:
+                median, n = stats[metric]["median"], stats[metric]["n"]
+                print(f"{format_config(config)}: {metric} median={median:.4f} ms n={n}")
+                break
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Summarize the result logs of a snapshot.")
+    parser.add_argument("snapshot", help=f"results directory, git REV[:PATH] or a {SUMMARY_NAME} file")
+    parser.add_argument("--summary", metavar="FILE", help="write a columnar JSON summary to FILE ('-' for stdout)")
+    parser.add_argument(
+        "--parsed", metavar="FILE", help="with --summary, list the logs the summary covers in FILE, one per line"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    if os.path.isfile(args.snapshot):
+        store = load_summary(args.snapshot)
+        print_summary({key: (entry["config"], entry["stats"]) for key, entry in store.items()})
+        return 0
+    with open_snapshot(args.snapshot) as root:
+        store = load_results(root)
+    if args.summary:
+        write_summary(store, args.summary)
+        if args.parsed:
+            # Logs no parser recognized are left out: they are not in the summary.
+            with open(args.parsed, "w", encoding="utf-8") as handle:
+                handle.writelines(f"{path}\n" for path in parsed_files(store, root))
+        return 0
+    print_summary({
+        key: (entry["config"], {name: summarize(values) for name, values in entry["samples"].items()})
+        for key, entry in store.items()
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))